@@ -0,0 +1,294 @@
+import io
+import json
+import math
+import hashlib
+
+import pandas as pd
+import pyarrow as pa
+
+from flask import Blueprint, Flask, Response, abort, jsonify, request, stream_with_context
+from typing import Dict, Iterator, List, Tuple
+from enum import Enum
+from logging import getLogger
+
+from lib.return_provider import ReturnProvider
+from lib.stock_data_repository import StockDataRepository
+from lib.portfolio_performance import PortfolioPerformanceProvider, Rebalancing, Weighting
+
+
+log = getLogger(__name__)
+
+JSON_MIMETYPE = 'application/json'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+# The PortfolioPerformanceData fields that can be pulled as a table
+PERFORMANCE_TABLES = ('port_cum_perf', 'stock_weights', 'stock_contributions',
+                      'sector_weights', 'sector_contribution', 'turnover')
+
+
+class PortfolioApi:
+    """REST endpoints for stock returns and portfolio performance.
+
+    Takes the same parameters as the sidebar, so anything on the UI can be pulled by other clients.
+    Responses carry an ETag and Last-Modified derived from the data version, so revalidation is a
+    cheap 304 that never touches the calculations, and tables are streamed in chunks of rows.
+    """
+    def __init__(self, rp: ReturnProvider, ppp: PortfolioPerformanceProvider, sdr: StockDataRepository,
+                 server: Flask, tickers: List[str], url_prefix: str = '/api', chunk_rows: int = 5000):
+        """Instantiates the endpoints and registers them on the server.
+
+        Args:
+            rp (ReturnProvider): Provider for the stock returns
+            ppp (PortfolioPerformanceProvider): Provider for the portfolio performance
+            sdr (StockDataRepository): Will need the repository for the data version
+            server (Flask): The server to register the endpoints on
+            tickers (List[str]): The tickers available, also used when none are requested
+            url_prefix (str, optional): Prefix of all endpoint URLs. Defaults to '/api'.
+            chunk_rows (int, optional): Rows serialised per streamed chunk. Defaults to 5000.
+        """
+        self.__rp = rp
+        self.__ppp = ppp
+        self.__sdr = sdr
+        self.__tickers = list(tickers)
+        self.chunk_rows = chunk_rows
+
+        bp = Blueprint('portfolio_api', __name__, url_prefix=url_prefix)
+
+        @bp.route('/returns')
+        def returns():
+            """Daily stock returns."""
+            return self.__table_response(
+                lambda p: self.__rp.get_stock_return_data(p['start_date'], p['end_date'], p['tickers']))
+
+        @bp.route('/cumulative-returns')
+        def cumulative_returns():
+            """Cumulative daily stock returns."""
+            return self.__table_response(
+                lambda p: self.__rp.get_cumulative_return_data(p['start_date'], p['end_date'], p['tickers']))
+
+        @bp.route('/portfolio-performance')
+        def portfolio_performance():
+            """Portfolio performance summary, JSON only as it is a handful of numbers."""
+            params = self.__parse_params(with_weighting=True)
+            if self.__response_format() != 'json':
+                abort(406, 'Portfolio performance summary is only available as JSON')
+
+            version = self.__sdr.get_data_version()
+            resp = self.__not_modified(params, 'json', version)
+            if resp is not None:
+                return resp
+
+            perf = self.__calculate_performance(params)
+            rebalance_dates = perf.rebalance_dates
+            resp = jsonify(tickers=perf.tickers, weighting=perf.weighting.name,
+                           # Custom rebalance dates replace the rebalancing schedule
+                           rebalancing=perf.rebalancing.name if perf.rebalancing is not None else None,
+                           rebalance_dates=None if rebalance_dates is None
+                           else [d.strftime('%Y-%m-%d') for d in rebalance_dates],
+                           port_ann_ret=self.__finite(perf.port_ann_ret),
+                           port_ann_vol=self.__finite(perf.port_ann_vol),
+                           port_sharpe_ratio=self.__finite(perf.port_sharpe_ratio),
+                           port_ann_turnover=self.__finite(perf.port_ann_turnover))
+            return self.__set_cache_headers(resp, params, 'json', version)
+
+        @bp.route('/portfolio-performance/<table>')
+        def portfolio_performance_table(table: str):
+            """One of the tables of the portfolio performance."""
+            if table not in PERFORMANCE_TABLES:
+                abort(404, f'Unknown table {table}, available: {", ".join(PERFORMANCE_TABLES)}')
+
+            def get_table(p):
+                df = getattr(self.__calculate_performance(p), table)
+                return df.to_frame(df.name or 'Portfolio') if isinstance(df, pd.Series) else df
+
+            return self.__table_response(get_table, with_weighting=True)
+
+        server.register_blueprint(bp)
+
+    def __calculate_performance(self, params: Dict):
+        try:
+            return self.__ppp.calculate_portfolio_performance(params['start_date'], params['end_date'],
+                                                              params['tickers'], params['weighting'],
+                                                              params['rebalancing'], params['rebalance_dates'])
+        except ValueError as e:
+            # A period with no trading days
+            abort(400, str(e))
+
+    @staticmethod
+    def __finite(x: float) -> float:
+        """The number as a float, or None if NaN or infinite, as JSON has no representation for them."""
+        x = float(x)
+        return x if math.isfinite(x) else None
+
+    def __parse_params(self, with_weighting: bool = False) -> Dict:
+        """Parse and validate the request parameters, aborting with 400 on bad input.
+
+        Args:
+            with_weighting (bool, optional): Whether the weighting and rebalancing parameters apply.
+                Defaults to False.
+
+        Returns:
+            Dict: The parsed parameters
+        """
+        args = request.args
+        params = {}
+        for p in ('start_date', 'end_date'):
+            if p not in args:
+                abort(400, f'Parameter {p} is required')
+            try:
+                date = pd.Timestamp(args[p])
+            except ValueError:
+                date = pd.NaT
+            # An empty string parses to NaT rather than failing
+            if pd.isna(date):
+                abort(400, f'Parameter {p} is not a valid date: {args[p]}')
+            params[p] = date.normalize()
+
+        if params['start_date'] > params['end_date']:
+            abort(400, 'Parameter start_date must not be after end_date')
+
+        # Dropping blanks and repeated tickers, keeping the order requested
+        tickers = list(dict.fromkeys(t.strip().upper() for t in args.get('tickers', '').split(',') if t.strip()))
+        if tickers:
+            unknown = [t for t in tickers if t not in self.__tickers]
+            if unknown:
+                abort(400, f'Unknown tickers: {", ".join(unknown)}')
+            params['tickers'] = tickers
+        else:
+            params['tickers'] = self.__tickers
+
+        if with_weighting:
+            weighting = args.get('weighting', Weighting.EQUAL.name).upper()
+            if weighting not in Weighting.__members__:
+                abort(400, f'Unknown weighting {weighting}, available: {", ".join(Weighting.__members__)}')
+            params['weighting'] = Weighting[weighting]
+
+            rebalancing = args.get('rebalancing', Rebalancing.DAILY.name).upper()
+            if rebalancing not in Rebalancing.__members__:
+                abort(400, f'Unknown rebalancing {rebalancing}, available: {", ".join(Rebalancing.__members__)}')
+            params['rebalancing'] = Rebalancing[rebalancing]
+
+            # Custom rebalance dates, overriding the rebalancing schedule
+            rebalance_dates = args.get('rebalance_dates')
+            if rebalance_dates:
+                try:
+                    dates = [pd.Timestamp(d) for d in rebalance_dates.split(',')]
+                except ValueError:
+                    dates = [pd.NaT]
+                # Empty parts parse to NaT rather than failing
+                if any(pd.isna(d) for d in dates):
+                    abort(400, f'Parameter rebalance_dates is not a list of valid dates: {rebalance_dates}')
+                rebalance_dates = sorted(d.normalize() for d in dates)
+            params['rebalance_dates'] = rebalance_dates or None
+
+        return params
+
+    @staticmethod
+    def __response_format() -> str:
+        """The requested format, from the format parameter or else the Accept header."""
+        fmt = request.args.get('format')
+        if fmt is None:
+            best = request.accept_mimetypes.best_match([JSON_MIMETYPE, ARROW_MIMETYPE], default=JSON_MIMETYPE)
+            fmt = 'arrow' if best == ARROW_MIMETYPE else 'json'
+
+        if fmt not in ('json', 'arrow'):
+            abort(400, f'Unknown format {fmt}, available: json, arrow')
+
+        return fmt
+
+    def __etag(self, params: Dict, fmt: str, data_version: str) -> str:
+        """ETag of the response, as a hash of the data version and everything that defines the response."""
+        key = {k: v.name if isinstance(v, Enum) else str(v) for k, v in params.items()}
+        key.update(path=request.path, format=fmt, version=data_version)
+
+        return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+    def __not_modified(self, params: Dict, fmt: str, version: Tuple[str, pd.Timestamp]) -> Response:
+        """Check the conditional request headers, before doing any calculations.
+
+        The data version is read once per request, before anything is calculated, as reading it drops
+        the cached data if they changed. The response is then never newer than the version it carries.
+
+        Returns:
+            Response: A 304 response if the client's copy is still valid, None otherwise.
+        """
+        data_version, last_modified = version
+        etag = self.__etag(params, fmt, data_version)
+
+        # If-None-Match takes precedence over If-Modified-Since when both are sent
+        if request.if_none_match:
+            fresh = request.if_none_match.contains_weak(etag)
+        elif request.if_modified_since is not None:
+            fresh = request.if_modified_since >= last_modified.floor('s').to_pydatetime()
+        else:
+            fresh = False
+
+        if not fresh:
+            return None
+
+        return self.__set_cache_headers(Response(status=304), params, fmt, version)
+
+    def __set_cache_headers(self, resp: Response, params: Dict, fmt: str,
+                            version: Tuple[str, pd.Timestamp]) -> Response:
+        data_version, last_modified = version
+        resp.set_etag(self.__etag(params, fmt, data_version))
+        resp.last_modified = last_modified.to_pydatetime()
+        # Caches may store the response, but have to revalidate it every time
+        resp.cache_control.public = True
+        resp.cache_control.no_cache = True
+        resp.vary.add('Accept')
+
+        return resp
+
+    def __table_response(self, get_table, with_weighting: bool = False) -> Response:
+        """Build a streamed table response, or a 304 if the client's copy is still valid.
+
+        Args:
+            get_table (Callable): Function of the parsed parameters returning the dataframe to send
+            with_weighting (bool, optional): Whether the weighting parameter applies. Defaults to False.
+
+        Returns:
+            Response: The response to send
+        """
+        params = self.__parse_params(with_weighting=with_weighting)
+        fmt = self.__response_format()
+        version = self.__sdr.get_data_version()
+        resp = self.__not_modified(params, fmt, version)
+        if resp is not None:
+            return resp
+
+        df = get_table(params).astype('float64')
+        df.columns = [str(c) for c in df.columns]
+        df = df.reset_index()
+        log.info('Streaming %d rows of %s as %s', len(df), request.path, fmt)
+
+        if fmt == 'arrow':
+            resp = Response(stream_with_context(self.__stream_arrow(df)), mimetype=ARROW_MIMETYPE)
+        else:
+            resp = Response(stream_with_context(self.__stream_json(df)), mimetype=JSON_MIMETYPE)
+
+        return self.__set_cache_headers(resp, params, fmt, version)
+
+    def __stream_json(self, df: pd.DataFrame) -> Iterator[str]:
+        """Stream the dataframe as JSON with columns and data (list of rows) keys."""
+        yield f'{{"columns": {json.dumps(list(df.columns))}, "data": ['
+        for i in range(0, len(df), self.chunk_rows):
+            rows = df.iloc[i:i + self.chunk_rows].to_json(orient='values', date_format='iso')
+            # Dropping the enclosing brackets, so the chunks form one list
+            yield (',' if i else '') + rows[1:-1]
+        yield ']}'
+
+    def __stream_arrow(self, df: pd.DataFrame) -> Iterator[bytes]:
+        """Stream the dataframe in Arrow IPC streaming format, one record batch per chunk."""
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for i in range(0, len(df), self.chunk_rows):
+                writer.write_batch(pa.RecordBatch.from_pandas(df.iloc[i:i + self.chunk_rows],
+                                                              schema=schema, preserve_index=False))
+                # Handing over whatever has been written so far, and reusing the buffer
+                yield sink.getvalue()
+                sink.seek(0)
+                sink.truncate()
+
+        yield sink.getvalue()
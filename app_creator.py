@@ -9,6 +9,14 @@ from components.sidebar import Sidebar
 class AppCreator:
     """App instantiator."""
 
+    def __init__(self, data_dir: str = 'data'):
+        """Instantiate class
+
+        Args:
+            data_dir (str, optional): Directory with the data CSVs. Defaults to 'data'.
+        """
+        self.data_dir = data_dir
+
     def create_app(self):
         """Create the Dash app, and return the Flask server to host
 
@@ -19,7 +27,7 @@ class AppCreator:
         load_figure_template('BOOTSTRAP')
 
         sidebar = Sidebar()
-        main = MainContent(app, sidebar)
+        main = MainContent(app, sidebar, self.data_dir)
 
         app.layout = dbc.Container(dbc.Row([dbc.Col(sidebar.comp, width=3),
                                             dbc.Col(main.comp)]))
@@ -0,0 +1,31 @@
+import plotly.express as px
+
+from dash import Dash, Input, Output, State, dcc
+from typing import List
+
+from lib.covariance_engine import CovarianceEngine
+
+
+class CorrelationChart:
+    """Stock correlation heatmap component.
+    
+    Just creates and refreshes the correlation heatmap of the stock returns.
+    """
+    def __init__(self, ce: CovarianceEngine, app: Dash, tickers: List[str], start_date, end_date, refresh_button):
+        # Populating the component
+        self.comp = dcc.Graph(style={'height': '80vh'})
+
+        # The callback to refresh the component as needed
+        @app.callback(
+            Output(self.comp, "figure"),
+            State(start_date, "date"),
+            State(end_date, "date"),
+            Input(refresh_button, "n_clicks")
+            )
+        def refresh_correlation_chart(start_date, end_date, _):
+            corr = ce.get_correlation(start_date, end_date, tickers)
+
+            fig = px.imshow(corr, zmin=-1, zmax=1, text_auto='.2f', color_continuous_scale='RdBu_r')
+            fig.update_layout(xaxis_title=None, yaxis_title=None)
+
+            return fig
@@ -7,11 +7,17 @@ from components.stock_data_table import StockDataTable
 
 from components.sidebar import Sidebar
 from components.stock_returns_chart import StockReturnsChart
+from components.correlation_chart import CorrelationChart
 from components.port_performance_components import PortfolioPerformanceComponents
+from components.risk_analytics_components import RiskAnalyticsComponents
+
+from api.portfolio_api import PortfolioApi
 
 from lib.return_provider import ReturnProvider
 from lib.stock_data_repository import StockDataRepository
+from lib.covariance_engine import CovarianceEngine
 from lib.portfolio_performance import PortfolioPerformanceProvider
+from lib.risk_analytics import RiskAnalyticsProvider
 
 
 class MainContent:
@@ -20,19 +26,28 @@ class MainContent:
     This is where classes are instantiated and the dependency injection happens.
     It builds the main content of the application.
     """
-    def __init__(self, app: Dash, sidebar: Sidebar):
+    def __init__(self, app: Dash, sidebar: Sidebar, data_dir: str = 'data'):
         # Instantiate the data providers
-        sdr = StockDataRepository()
+        sdr = StockDataRepository(data_dir=data_dir)
         rp = ReturnProvider(sdr=sdr)
-        ppp = PortfolioPerformanceProvider(rp=rp, sdr=sdr)
 
         # Get the tickers to use
         tickers = list(sdr.get_stocks_with_prices())
 
+        # The covariance engine holds the return matrix of all the tickers, so it is shared
+        ce = CovarianceEngine(rp=rp, tickers=tickers, sdr=sdr)
+        ppp = PortfolioPerformanceProvider(rp=rp, sdr=sdr, ce=ce)
+        rap = RiskAnalyticsProvider(rp=rp)
+
         # Instantiate the component providers
         src = StockReturnsChart(rp, app, sidebar.start_date, sidebar.end_date, sidebar.refresh)
-        sdt = StockDataTable(sdr, tickers)
-        ppc = PortfolioPerformanceComponents(ppp, app, tickers, sidebar.start_date, sidebar.end_date, sidebar.weighting, sidebar.refresh)
+        sdt = StockDataTable(sdr, app, tickers)
+        cc = CorrelationChart(ce, app, tickers, sidebar.start_date, sidebar.end_date, sidebar.refresh)
+        ppc = PortfolioPerformanceComponents(ppp, app, tickers, sidebar.start_date, sidebar.end_date, sidebar.weighting, sidebar.rebalancing, sidebar.refresh)
+        rac = RiskAnalyticsComponents(rap, ppp, app, tickers, sidebar.start_date, sidebar.end_date, sidebar.weighting, sidebar.rebalancing, sidebar.refresh)
+
+        # Expose the same data over REST on the underlying server
+        PortfolioApi(rp, ppp, sdr, app.server, tickers)
 
         # Create the tabs
         self.comp = dcc.Tabs([
@@ -42,5 +57,7 @@ class MainContent:
             dcc.Tab(dbc.Card(dbc.CardBody(dcc.Loading(ppc.port_stock_weights))), label='Stock Weights'),
             dcc.Tab(dbc.Card(dbc.CardBody(dcc.Loading(ppc.port_stock_contr))), label='Stock Contributions'),
             dcc.Tab(dbc.Card(dbc.CardBody(dcc.Loading(ppc.port_sector_weights))), label='Sector Weights'),
-            dcc.Tab(dbc.Card(dbc.CardBody(dcc.Loading(ppc.port_sector_contr))), label='Sector Contributions')
+            dcc.Tab(dbc.Card(dbc.CardBody(dcc.Loading(ppc.port_sector_contr))), label='Sector Contributions'),
+            dcc.Tab(dbc.Card(dbc.CardBody(dcc.Loading([rac.rolling_vol, rac.rolling_sharpe, rac.drawdown, rac.drawdown_table, rac.rolling_beta]))), label='Risk Analytics'),
+            dcc.Tab(dbc.Card(dbc.CardBody(dcc.Loading(cc.comp))), label='Correlations')
             ])
@@ -4,7 +4,7 @@ import dash_bootstrap_components as dbc
 from dash import Dash, Input, Output, State, dcc, html
 from typing import List
 
-from lib.portfolio_performance import PortfolioPerformanceProvider, Weighting
+from lib.portfolio_performance import PortfolioPerformanceProvider, Rebalancing, Weighting
 
 
 class PortfolioPerformanceComponents:
@@ -14,7 +14,7 @@ class PortfolioPerformanceComponents:
     """
     def __init__(self, ppp: PortfolioPerformanceProvider, app: Dash,
                  tickers: List[str],
-                 start_date, end_date, weighting, refresh_button):
+                 start_date, end_date, weighting, rebalancing, refresh_button):
         # We exposure the controls we populate, so that they can be referenced from the caller
         self.port_cum_perf = dcc.Graph()
         self.port_stock_weights = dcc.Graph()
@@ -34,13 +34,15 @@ class PortfolioPerformanceComponents:
             State(start_date, "date"),
             State(end_date, "date"),
             State(weighting, "value"),
+            State(rebalancing, "value"),
             Input(refresh_button, "n_clicks")
             )
-        def refresh_portfolio_return_comps(start_date, end_date, weighting, _):
+        def refresh_portfolio_return_comps(start_date, end_date, weighting, rebalancing, _):
             """Callback to refresh all portfolio performance related components."""
 
             # Extract performance data
-            perf = ppp.calculate_portfolio_performance(start_date, end_date, tickers, Weighting[weighting])
+            perf = ppp.calculate_portfolio_performance(start_date, end_date, tickers, Weighting[weighting],
+                                                       Rebalancing[rebalancing])
             ret = perf.port_cum_perf.reset_index()
             ret.columns = ['Date', 'Portfolio']
 
@@ -87,6 +89,8 @@ class PortfolioPerformanceComponents:
                                      html.Tr([html.Th('Annualised Volatility:', style={'text-align': 'right'}),
                                               html.Td(f'{100*perf.port_ann_vol:.2f}%')]),
                                      html.Tr([html.Th('Sharpe Ratio:', style={'text-align': 'right'}),
-                                              html.Td(f'{perf.port_sharpe_ratio:.2f}')])])
+                                              html.Td(f'{perf.port_sharpe_ratio:.2f}')]),
+                                     html.Tr([html.Th('Annualised Turnover:', style={'text-align': 'right'}),
+                                              html.Td(f'{100*perf.port_ann_turnover:.2f}%')])])
 
             return port_perf, swgt, scontr, secontr, secwgt, perf_table
@@ -0,0 +1,84 @@
+import plotly.express as px
+import dash_bootstrap_components as dbc
+
+from dash import Dash, Input, Output, State, dcc, html
+from typing import List
+
+from lib.portfolio_performance import PortfolioPerformanceProvider, Rebalancing, Weighting
+from lib.risk_analytics import RiskAnalyticsProvider
+
+
+class RiskAnalyticsComponents:
+    """Risk analytics components.
+
+    This uses the outputs of RiskAnalyticsProvider to render them on the app.
+    """
+    def __init__(self, rap: RiskAnalyticsProvider, ppp: PortfolioPerformanceProvider, app: Dash,
+                 tickers: List[str],
+                 start_date, end_date, weighting, rebalancing, refresh_button):
+        # We exposure the controls we populate, so that they can be referenced from the caller
+        self.rolling_vol = dcc.Graph()
+        self.rolling_sharpe = dcc.Graph()
+        self.drawdown = dcc.Graph()
+        self.rolling_beta = dcc.Graph()
+        self.drawdown_table = dbc.Table(bordered=True)
+
+        # The callback that will populate the controls
+        @app.callback(
+            Output(self.rolling_vol, "figure"),
+            Output(self.rolling_sharpe, "figure"),
+            Output(self.drawdown, "figure"),
+            Output(self.rolling_beta, "figure"),
+            Output(self.drawdown_table, 'children'),
+            State(start_date, "date"),
+            State(end_date, "date"),
+            State(weighting, "value"),
+            State(rebalancing, "value"),
+            Input(refresh_button, "n_clicks")
+            )
+        def refresh_risk_analytics_comps(start_date, end_date, weighting, rebalancing, _):
+            """Callback to refresh all risk analytics related components."""
+
+            # Extract risk analytics data, the portfolio is shared with the portfolio performance callback
+            # of the same refresh, through the provider's cache
+            perf = ppp.calculate_portfolio_performance(start_date, end_date, tickers, Weighting[weighting],
+                                                       Rebalancing[rebalancing])
+            ra = rap.calculate_risk_analytics(perf)
+
+            # Rolling volatility
+            ret = ra.rolling_vol.reset_index()
+            ret.columns.name = 'Window'
+
+            vol = px.line(ret, x='Date', y=ret.columns, title='Rolling Volatility')
+            vol.layout.yaxis.tickformat = ',.0%'
+            vol.update_layout(xaxis_title=None, yaxis_title=None)
+
+            # Rolling sharpe ratio
+            ret = ra.rolling_sharpe.reset_index()
+            ret.columns.name = 'Window'
+
+            sharpe = px.line(ret, x='Date', y=ret.columns, title='Rolling Sharpe Ratio')
+            sharpe.update_layout(xaxis_title=None, yaxis_title=None)
+
+            # Drawdown
+            ret = ra.drawdown.reset_index()
+
+            dd = px.area(ret, x='Date', y='Drawdown', title='Drawdown')
+            dd.layout.yaxis.tickformat = ',.0%'
+            dd.update_layout(xaxis_title=None, yaxis_title=None)
+
+            # Rolling stock betas
+            ret = ra.rolling_beta.reset_index()
+            ret.columns.name = 'Stock'
+
+            beta = px.line(ret, x='Date', y=ret.columns, title='Rolling Beta to Portfolio',
+                           color_discrete_sequence=px.colors.qualitative.Alphabet)
+            beta.update_layout(xaxis_title=None, yaxis_title=None)
+
+            # Populate the drawdown table
+            dd_table = html.Tbody([html.Tr([html.Th('Max Drawdown:', style={'text-align': 'right'}),
+                                            html.Td(f'{100*ra.max_drawdown:.2f}%')]),
+                                   html.Tr([html.Th('Max Drawdown Duration:', style={'text-align': 'right'}),
+                                            html.Td(f'{ra.max_drawdown_duration} trading days')])])
+
+            return vol, sharpe, dd, beta, dd_table
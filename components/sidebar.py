@@ -29,8 +29,15 @@ class Sidebar:
                                              max_date_allowed=dt.date(2024, 1, 26),
                                              date=dt.date(2024, 1, 26))
         self.weighting = dbc.Select(options=[{'label': 'Equal', 'value': 'EQUAL'},
-                                             {'label': 'Inverse Vol', 'value': 'INVERSE_VOL'}],
+                                             {'label': 'Inverse Vol', 'value': 'INVERSE_VOL'},
+                                             {'label': 'Minimum Variance', 'value': 'MIN_VARIANCE'},
+                                             {'label': 'Risk Parity', 'value': 'RISK_PARITY'}],
                                     value='EQUAL')
+        self.rebalancing = dbc.Select(options=[{'label': 'Daily', 'value': 'DAILY'},
+                                               {'label': 'Weekly', 'value': 'WEEKLY'},
+                                               {'label': 'Monthly', 'value': 'MONTHLY'},
+                                               {'label': 'Quarterly', 'value': 'QUARTERLY'}],
+                                      value='DAILY')
         
         self.refresh = dbc.Button('Refresh')
 
@@ -44,6 +51,8 @@ class Sidebar:
             html.Hr(),
             dbc.Row([dbc.Col(html.H6('Weighting'), style={'text-align': 'right'}),
                      dbc.Col(self.weighting)], align='center'),
+            dbc.Row([dbc.Col(html.H6('Rebalancing'), style={'text-align': 'right'}),
+                     dbc.Col(self.rebalancing)], align='center'),
             html.Hr(),
             dbc.Row([self.refresh])
             ], style=SIDEBAR_STYLE)
@@ -1,22 +1,114 @@
-import dash_bootstrap_components as dbc
+import re
+
+from dash import Dash, Input, Output, ctx, dash_table
 
 from lib.stock_data_repository import StockDataRepository
-from typing import List
+from typing import Any, Dict, List, Tuple
+
+
+# Operators of the table's filter syntax, and their repository names
+FILTER_OPERATORS = {'>=': 'ge', '<=': 'le', '<': 'lt', '>': 'gt', '!=': 'ne', '=': 'eq',
+                    'ge': 'ge', 'le': 'le', 'lt': 'lt', 'gt': 'gt', 'ne': 'ne', 'eq': 'eq',
+                    'contains': 'contains', 'icontains': 'contains', 'scontains': 'contains'}
+
+FILTER_PART = re.compile(r'^\{(?P<col>.+?)\}\s*(?P<op>>=|<=|!=|<|>|=|[a-z]+)\s*(?P<value>.*)$')
+
+
+def parse_filter_query(filter_query: str) -> List[Tuple[str, str, Any]]:
+    """Parse the filter query of a DataTable into the filters the repository takes.
+
+    Args:
+        filter_query (str): The query, e.g. '{GICS Sector} contains tech && {CIK} > 500000'
+
+    Returns:
+        List[Tuple[str, str, Any]]: Column, operator and value of each filter, with unquoted numbers parsed
+            for the comparisons. Parts that cannot be parsed are ignored.
+    """
+    filters = []
+    for part in (filter_query or '').split(' && '):
+        m = FILTER_PART.match(part.strip())
+        if m is None or m['op'] not in FILTER_OPERATORS:
+            continue
+
+        op = FILTER_OPERATORS[m['op']]
+        value = m['value'].strip()
+        if len(value) > 1 and value[0] == value[-1] and value[0] in ('"', "'", '`'):
+            value = value[1:-1]
+        elif op != 'contains':
+            # Contains matches the text typed, e.g. 1975 rather than 1975.0
+            try:
+                value = float(value)
+            except ValueError:
+                pass
+
+        filters.append((m['col'], op, value))
+
+    return filters
 
 
 class StockDataTable:
     """Provider for the stock data table component.
-    
-    Just populate the stock standing data table.
+
+    Pages, sorts and filters the stock standing data on the server, so only the visible page is sent over.
     """
 
-    def __init__(self, sdr: StockDataRepository, tickers: List[str]):
+    def __init__(self, sdr: StockDataRepository, app: Dash, tickers: List[str], page_size: int = 20):
         """Instantiates the component.
 
         Args:
             sdr (StockDataRepository): Will need the repository to pull stock details
+            app (Dash): The app to register the callback on
             tickers (List[str]): A list of tickers to return data for.
+            page_size (int, optional): Number of rows on each page. Defaults to 20.
         """
-        # Nothing dynamic for this table, so nothing exposed other than the comp
-        sd = sdr.get_stock_standing_data(tickers)
-        self.comp = dbc.Table.from_dataframe(sd, striped=True, bordered=True, hover=True)
+        self.__sdr = sdr
+        self.__tickers = tickers
+
+        # Only the columns in the layout, the rows come from the callback
+        self.__columns = list(sdr.query_stock_standing_data(tickers, page_size=0)[0].columns)
+        self.comp = dash_table.DataTable(columns=[{'name': c, 'id': c} for c in self.__columns],
+                                         page_current=0, page_size=page_size, page_action='custom',
+                                         sort_action='custom', sort_mode='multi', sort_by=[],
+                                         filter_action='custom', filter_query='',
+                                         style_cell={'textAlign': 'left'})
+
+        # The callback to populate the page shown
+        @app.callback(
+            Output(self.comp, 'data'),
+            Output(self.comp, 'page_count'),
+            Output(self.comp, 'page_current'),
+            Input(self.comp, 'page_current'),
+            Input(self.comp, 'page_size'),
+            Input(self.comp, 'sort_by'),
+            Input(self.comp, 'filter_query')
+            )
+        def refresh_stock_data_table(page_current, page_size, sort_by, filter_query):
+            # A new filter or sort starts from the first page
+            if any(p.endswith(('.sort_by', '.filter_query')) for p in ctx.triggered_prop_ids):
+                page_current = 0
+            return self.get_page(page_current, page_size, sort_by, filter_query)
+
+    def get_page(self, page_current: int, page_size: int, sort_by: List[Dict],
+                 filter_query: str) -> Tuple[List[Dict], int, int]:
+        """Get the rows of a page of the table, with the properties of the DataTable.
+
+        Args:
+            page_current (int): The page to return, starting from 0, the last page if past it
+            page_size (int): Number of rows on each page
+            sort_by (List[Dict]): The column_id and direction of each sort
+            filter_query (str): The filter query, filters on columns not in the table are ignored
+
+        Returns:
+            Tuple[List[Dict], int, int]: The records on the page, the number of pages and the page returned
+        """
+        filters = [f for f in parse_filter_query(filter_query) if f[0] in self.__columns]
+        sort_by = [(s['column_id'], s['direction'] == 'asc') for s in sort_by or [] if s['column_id'] in self.__columns]
+        page_current = page_current or 0
+        sd, rows = self.__sdr.query_stock_standing_data(self.__tickers, filters, sort_by, page_current, page_size)
+
+        page_count = max(1, -(-rows // page_size))
+        if page_current >= page_count:
+            page_current = page_count - 1
+            sd, _ = self.__sdr.query_stock_standing_data(self.__tickers, filters, sort_by, page_current, page_size)
+
+        return sd.to_dict('records'), page_count, page_current
@@ -0,0 +1,206 @@
+import math
+import threading
+
+import pandas as pd
+import numpy as np
+
+from typing import List, Tuple
+from logging import getLogger
+from dataclasses import dataclass
+
+from lib.return_provider import ReturnProvider
+from lib.stock_data_repository import StockDataRepository
+
+
+log = getLogger(__name__)
+
+
+@dataclass
+class _PrefixSums:
+    """Data struct to hold the return matrix and its prefix sums, swapped as a whole on rebuilds."""
+
+    generation: int
+    index: pd.DatetimeIndex
+    columns: pd.Index
+    x: np.ndarray
+    m: np.ndarray
+    xx: np.ndarray
+    stride: int
+    count: np.ndarray
+    sum: np.ndarray
+    sum_sq: np.ndarray
+    sum_prod: np.ndarray
+
+
+class CovarianceEngine:
+    """Covariances and correlations of stock returns over any date window.
+
+    The daily returns of all the stocks are loaded once, and prefix sums of the returns and their
+    cross-products are kept, so the sums over a window are a subtraction of two N x N matrices. Stocks
+    with missing history are handled pairwise, by also keeping the number of days both stocks have returns.
+
+    Keeping the prefix sums for every day takes T x N x N memory, which is too much for large universes,
+    so they are kept every few days to fit in max_memory_mb, and the days between are summed directly.
+    With a small universe that is every day.
+
+    When given the repository the returns come from, the prefix sums are rebuilt whenever its data change.
+    """
+    def __init__(self, rp: ReturnProvider = None, tickers: List[str] = None, max_memory_mb: int = 256,
+                 sdr: StockDataRepository = None):
+        """Instantiate class, the return matrix is built on first use.
+
+        Args:
+            rp (ReturnProvider, optional): Provider of the stock returns. Defaults to None.
+            tickers (List[str], optional): The tickers to cover, defaults to all available. Defaults to None.
+            max_memory_mb (int, optional): Memory budget for the prefix sums. Defaults to 256.
+            sdr (StockDataRepository, optional): Repository behind the returns, to rebuild when its data
+                change. Defaults to None, building once.
+        """
+        # Injecting the dependencies here, but also instantiating if not provided for easier debugging
+        self.__rp = rp or ReturnProvider()
+        self.__sdr = sdr
+        self.__tickers = tickers
+        self.max_memory_mb = max_memory_mb
+        self.__lock = threading.Lock()
+        self.__data = None
+
+    def __generation(self) -> int:
+        return 0 if self.__sdr is None else self.__sdr.data_generation
+
+    def __get_data(self) -> _PrefixSums:
+        """The prefix sums on the current data, building them if missing or stale."""
+        data = self.__data
+        if data is not None and data.generation == self.__generation():
+            return data
+
+        with self.__lock:
+            generation = self.__generation()
+            if self.__data is None or self.__data.generation != generation:
+                self.__data = self.__build(generation)
+            return self.__data
+
+    def __build(self, generation: int) -> _PrefixSums:
+        """Load the return matrix, and calculate the prefix sums at every checkpoint."""
+        ret = self.__rp.get_stock_return_data(pd.Timestamp.min, pd.Timestamp.max, self.__tickers)
+        ret = ret.sort_index()
+        n_days, n_stocks = ret.shape
+
+        # Demeaning, which leaves covariances unchanged but keeps the sums small
+        x = ret.to_numpy(dtype=float)
+        m = ~np.isnan(x)
+        x = np.where(m, x - np.nanmean(x, axis=0), 0)
+        m = m.astype(float)
+
+        # Every how many days we can afford to keep the 4 N x N prefix sums
+        checkpoints = max(2, self.max_memory_mb * 2**20 // (4 * 8 * n_stocks * n_stocks))
+        stride = max(1, math.ceil(n_days / (checkpoints - 1)))
+        n_blocks = n_days // stride
+        log.info('Building covariance prefix sums for %d stocks over %d days, every %d days',
+                 n_stocks, n_days, stride)
+
+        # Sums over each block of days, then accumulated, with a leading zero for the start
+        def prefix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+            ab = np.zeros((n_blocks + 1, n_stocks, n_stocks))
+            a = a[:n_blocks * stride].reshape(n_blocks, stride, n_stocks)
+            b = b[:n_blocks * stride].reshape(n_blocks, stride, n_stocks)
+            np.cumsum(np.matmul(a.transpose(0, 2, 1), b), axis=0, out=ab[1:])
+            return ab
+
+        xx = x * x
+        return _PrefixSums(generation=generation, index=ret.index, columns=ret.columns, x=x, m=m, xx=xx,
+                           stride=stride, count=prefix(m, m), sum=prefix(x, m), sum_sq=prefix(xx, m),
+                           sum_prod=prefix(x, x))
+
+    def __window_sums(self, from_date, to_date) -> Tuple[pd.Index, Tuple[np.ndarray, ...]]:
+        """Pairwise sums over the days in the window.
+
+        Returns:
+            Tuple[pd.Index, Tuple[np.ndarray, ...]]: The tickers of the sums, and the sums: number of days both
+                stocks have returns, sum of returns of the first and sum of squared returns of the first over
+                those days, and sum of products of returns.
+        """
+        data = self.__get_data()
+        start = data.index.searchsorted(pd.Timestamp(from_date), 'left')
+        end = data.index.searchsorted(pd.Timestamp(to_date), 'right')
+
+        def direct(a: int, b: int) -> Tuple[np.ndarray, ...]:
+            x, m, xx = data.x[a:b], data.m[a:b], data.xx[a:b]
+            return m.T @ m, x.T @ m, xx.T @ m, x.T @ x
+
+        # Whole blocks from the prefix sums, and the days at the edges directly
+        first, last = -(-start // data.stride), end // data.stride
+        if first >= last:
+            return data.columns, direct(start, end)
+
+        sums = [p[last] - p[first] for p in (data.count, data.sum, data.sum_sq, data.sum_prod)]
+        for a, b in ((start, first * data.stride), (last * data.stride, end)):
+            if a < b:
+                sums = [s + d for s, d in zip(sums, direct(a, b))]
+
+        return data.columns, tuple(sums)
+
+    def get_covariance(self, from_date: pd.Timestamp, to_date: pd.Timestamp,
+                       tickers: List[str] = None, min_periods: int = 2) -> pd.DataFrame:
+        """Pairwise covariance of daily returns between dates.
+
+        Args:
+            from_date (pd.Timestamp): Start date of the window
+            to_date (pd.Timestamp): End date of the window
+            tickers (List[str], optional): List of tickers, defaults to all covered. Defaults to None.
+            min_periods (int, optional): Days with returns needed for a pair, NaN otherwise. Defaults to 2.
+
+        Returns:
+            pd.DataFrame: Covariance matrix, with the tickers as index and columns.
+        """
+        columns, (n, s, _, sp) = self.__window_sums(from_date, to_date)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = (sp - s * s.T / n) / (n - 1)
+        cov[n < max(min_periods, 2)] = np.nan
+
+        return self.__to_frame(cov, columns, tickers)
+
+    def get_correlation(self, from_date: pd.Timestamp, to_date: pd.Timestamp,
+                        tickers: List[str] = None, min_periods: int = 2) -> pd.DataFrame:
+        """Pairwise correlation of daily returns between dates.
+
+        Args:
+            from_date (pd.Timestamp): Start date of the window
+            to_date (pd.Timestamp): End date of the window
+            tickers (List[str], optional): List of tickers, defaults to all covered. Defaults to None.
+            min_periods (int, optional): Days with returns needed for a pair, NaN otherwise. Defaults to 2.
+
+        Returns:
+            pd.DataFrame: Correlation matrix, with the tickers as index and columns.
+        """
+        columns, (n, s, ss, sp) = self.__window_sums(from_date, to_date)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # The variance of each stock is over the days the other stock has returns too
+            var = ss - s * s / n
+            corr = (sp - s * s.T / n) / np.sqrt(var * var.T)
+        corr[n < max(min_periods, 2)] = np.nan
+
+        return self.__to_frame(np.clip(corr, -1, 1), columns, tickers)
+
+    @staticmethod
+    def __to_frame(a: np.ndarray, columns: pd.Index, tickers: List[str] = None) -> pd.DataFrame:
+        df = pd.DataFrame(a, index=columns, columns=columns)
+        if tickers is not None:
+            df = df.loc[tickers, tickers]
+        return df
+
+
+if __name__ == "__main__":
+    import time
+    import logging
+    logging.basicConfig(format='%(asctime)s: %(name)s|%(levelname)s|%(message)s',
+                        datefmt='%Y-%m-%d %H:%M:%S')
+    logging.getLogger(__name__).setLevel(logging.INFO)
+
+    ce = CovarianceEngine()
+    start = time.perf_counter()
+    print(ce.get_correlation(pd.Timestamp(2010, 1, 1), pd.Timestamp(2024, 1, 1)))
+    print(f'Built and calculated in {time.perf_counter() - start:.3f}s')
+
+    start = time.perf_counter()
+    print(ce.get_covariance(pd.Timestamp(2015, 1, 1), pd.Timestamp(2020, 1, 1), ['MSFT', 'AAPL']))
+    print(f'Calculated in {time.perf_counter() - start:.3f}s')
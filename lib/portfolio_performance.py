@@ -1,14 +1,19 @@
 
+import threading
+
 import pandas as pd
 import numpy as np
 
-from typing import List
+from typing import List, Optional
 from enum import Enum
 from logging import getLogger
 from dataclasses import dataclass
+from collections import OrderedDict
+from concurrent.futures import Future
 
 from lib.return_provider import ReturnProvider
 from lib.stock_data_repository import StockDataRepository
+from lib.covariance_engine import CovarianceEngine
 
 
 log = getLogger(__name__)
@@ -17,6 +22,19 @@ log = getLogger(__name__)
 class Weighting(Enum):
     EQUAL = 1
     INVERSE_VOL = 2
+    MIN_VARIANCE = 3
+    RISK_PARITY = 4
+
+
+class Rebalancing(Enum):
+    DAILY = 1
+    WEEKLY = 2
+    MONTHLY = 3
+    QUARTERLY = 4
+
+
+# The periods on the first trading day of which we rebalance
+REBALANCING_PERIODS = {Rebalancing.WEEKLY: 'W', Rebalancing.MONTHLY: 'M', Rebalancing.QUARTERLY: 'Q'}
 
 
 @dataclass
@@ -25,11 +43,14 @@ class PortfolioPerformanceData:
 
     tickers: List[str]
     weighting: Weighting
+    rebalancing: Optional[Rebalancing]  # None when rebalancing on custom dates
+    rebalance_dates: Optional[List[pd.Timestamp]]  # The custom dates, None when on a rebalancing schedule
     port_cum_perf: pd.Series
     stock_contributions: pd.DataFrame
     stock_weights: pd.DataFrame
     sector_contribution: pd.DataFrame
     sector_weights: pd.DataFrame
+    turnover: pd.Series
 
     port_ann_ret: float
     port_ann_vol: float
@@ -38,39 +59,111 @@ class PortfolioPerformanceData:
     def port_sharpe_ratio(self):
         return self.port_ann_ret / self.port_ann_vol
 
+    @property
+    def port_ann_turnover(self):
+        return self.turnover.sum() * 252 / len(self.port_cum_perf)
+
 
 class PortfolioPerformanceProvider:
     """Constructs hypothetical portfolios and calculates performance.
     
     To avoid repeating calculations, we produce all the portfolio performance relevant data in one go,
-    as they all use the same underlying data.
+    as they all use the same underlying data. The results of the latest portfolios are also kept, as every
+    refresh of the UI asks for the same portfolio from several callbacks at once. So are the monthly covariance
+    based weights, which cost a solve on an N x N matrix each, and are shared by all overlapping periods.
     """
-    def __init__(self, rp: ReturnProvider = None, sdr: StockDataRepository = None, inverse_vol_window_weeks: int = 156):
+    def __init__(self, rp: ReturnProvider = None, sdr: StockDataRepository = None, inverse_vol_window_weeks: int = 156,
+                 ce: CovarianceEngine = None, covariance_window_weeks: int = 156, cache_size: int = 8,
+                 weights_cache_size: int = 4096):
         # Injecting the dependencies here, but also instantiating if not provided for easier debugging
         self.__sdr = sdr or StockDataRepository()
         self.__rp = rp or ReturnProvider(self.__sdr)
+        self.__ce = ce or CovarianceEngine(self.__rp, sdr=self.__sdr)
         self.inverse_vol_window_weeks = inverse_vol_window_weeks
+        self.covariance_window_weeks = covariance_window_weeks
+        self.cache_size = cache_size
+        self.weights_cache_size = weights_cache_size
+        self.__cache = OrderedDict()
+        self.__weights_cache = OrderedDict()
+        self.__lock = threading.Lock()
 
     def calculate_portfolio_performance(self,
                                         from_date: pd.Timestamp,
                                         to_date: pd.Timestamp,
                                         tickers: List[str],
-                                        weighting: Weighting) -> PortfolioPerformanceData:
+                                        weighting: Weighting,
+                                        rebalancing: Rebalancing = Rebalancing.DAILY,
+                                        rebalance_dates: List[pd.Timestamp] = None) -> PortfolioPerformanceData:
         """Calculate cumulative portfolio performance between dates.
 
+        Results are cached by the arguments and the data version, and concurrent calls for the same
+        portfolio wait for the one calculation in flight, so the result is shared and must not be modified.
+
         Args:
             from_date (pd.Timestamp): Start date of period
             to_date (pd.Timestamp): End date of period
             tickers (List[str]): List of tickers to include in portfolio
             weighting (Weighting): Weighting to use when constructing portfolio
+            rebalancing (Rebalancing, optional): How often to reset to the weighting. Defaults to Rebalancing.DAILY.
+            rebalance_dates (List[pd.Timestamp], optional): Custom dates to rebalance on instead, rolling to the
+                next trading day if needed. Defaults to None.
 
         Returns:
             PortfolioPerformanceData: The portfolio performance data, in an appropriate struct
+
+        Raises:
+            ValueError: If there are no trading days in the period
         """
-        log.info('Calculating portfolio performance for %d assets from %s to %s with weighting %s',
-                 len(tickers), from_date, to_date, weighting)
+        from_date, to_date = pd.Timestamp(from_date), pd.Timestamp(to_date)
+        if rebalance_dates is not None:
+            rebalance_dates = [pd.Timestamp(d) for d in rebalance_dates]
+        version, _ = self.__sdr.get_data_version()
+        key = (from_date, to_date, tuple(tickers), weighting, rebalancing,
+               None if rebalance_dates is None else tuple(rebalance_dates), version)
+
+        with self.__lock:
+            future = self.__cache.get(key)
+            calculate = future is None
+            if calculate:
+                future = self.__cache[key] = Future()
+                if len(self.__cache) > self.cache_size:
+                    self.__cache.popitem(last=False)
+            else:
+                self.__cache.move_to_end(key)
+
+        if not calculate:
+            return future.result()
+
+        try:
+            pp = self.__calculate_portfolio_performance(from_date, to_date, tickers, weighting,
+                                                        rebalancing, rebalance_dates, version)
+        except Exception as e:
+            # Not caching failures, the next call tries again
+            with self.__lock:
+                if self.__cache.get(key) is future:
+                    del self.__cache[key]
+            future.set_exception(e)
+            raise
+
+        future.set_result(pp)
+        return pp
+
+    def __calculate_portfolio_performance(self,
+                                          from_date: pd.Timestamp,
+                                          to_date: pd.Timestamp,
+                                          tickers: List[str],
+                                          weighting: Weighting,
+                                          rebalancing: Rebalancing,
+                                          rebalance_dates: List[pd.Timestamp],
+                                          version: str) -> PortfolioPerformanceData:
+        """Calculate cumulative portfolio performance between dates, with no caching."""
+        log.info('Calculating portfolio performance for %d assets from %s to %s with weighting %s and rebalancing %s',
+                 len(tickers), from_date, to_date, weighting,
+                 'custom' if rebalance_dates is not None else rebalancing)
         # Extract stock return data
         ret = self.__rp.get_stock_return_data(from_date, to_date, tickers)
+        if ret.empty:
+            raise ValueError(f'No trading days between {from_date} and {to_date}')
 
         # Determin the weights on any day
         wgt = pd.DataFrame(index=ret.index, columns=ret.columns)
@@ -99,8 +192,23 @@ class PortfolioPerformanceProvider:
                 mask = ~ret[col].isna() & ~vol[col].isna()
                 wgt.loc[mask, col] = vol.loc[mask, col]
 
+            # No weights on days before any stock has enough history for a vol
+            wgt = wgt.astype(float)
+            wgt = wgt.div(wgt.sum(1).replace(0, np.nan), axis=0)
+        elif weighting in (Weighting.MIN_VARIANCE, Weighting.RISK_PARITY):
+            # Re-estimating the covariance on the first day of each month, over the trailing window before it
+            months = ret.index.to_period('M')
+            for d in ret.index[np.r_[True, months[1:] != months[:-1]]]:
+                w = self.__covariance_weights(d, tickers, weighting, version)
+                wgt.loc[d] = w.reindex(wgt.columns).fillna(0)
+
+            # Then apply the weights in the same fashion, populating only non-NA cells
+            wgt = wgt.astype(float).ffill().where(~ret.isna())
             wgt = wgt.div(wgt.sum(1), axis=0)
 
+        # Let the weights drift between rebalances
+        wgt, turnover = self.__apply_rebalancing(ret, wgt.astype(float), rebalancing, rebalance_dates)
+
         # Calculate daily stock contributions
         contr = ret.multiply(wgt)
 
@@ -128,13 +236,207 @@ class PortfolioPerformanceProvider:
 
         # Construct the struct to return
         pp = PortfolioPerformanceData(tickers=tickers, weighting=weighting,
+                                      rebalancing=rebalancing if rebalance_dates is None else None,
+                                      rebalance_dates=rebalance_dates,
                                       port_cum_perf=cum_ret, stock_contributions=contr,
                                       stock_weights=wgt, sector_contribution=sector_contr,
-                                      sector_weights=sector_wgt,
+                                      sector_weights=sector_wgt, turnover=turnover,
                                       port_ann_ret=ann_ret, port_ann_vol=ann_vol)
 
         return pp
 
+    def __covariance_weights(self, date: pd.Timestamp, tickers: List[str], weighting: Weighting,
+                             version: str) -> pd.Series:
+        """Minimum variance or risk parity weights on a date, from the covariance over the window before it.
+
+        Args:
+            date (pd.Timestamp): The date the weights are set on
+            tickers (List[str]): List of tickers in the portfolio
+            weighting (Weighting): Either of the covariance based weightings
+            version (str): The version of the data, as the weights are cached
+
+        Returns:
+            pd.Series: The weights of the stocks with enough history
+        """
+        key = (date, tuple(tickers), weighting, self.covariance_window_weeks, version)
+        with self.__lock:
+            w = self.__weights_cache.get(key)
+            if w is not None:
+                self.__weights_cache.move_to_end(key)
+                return w
+
+        cov = self.__ce.get_covariance(date - pd.offsets.Week(self.covariance_window_weeks),
+                                       date - pd.offsets.Day(1), tickers,
+                                       min_periods=self.covariance_window_weeks * 5 // 2)
+        # Only stocks with enough history, and no covariance assumed for pairs without
+        has_hist = ~np.isnan(np.diag(cov))
+        cov = cov.loc[has_hist, has_hist].fillna(0)
+        if weighting == Weighting.MIN_VARIANCE:
+            w = self.__min_variance_weights(cov)
+        else:
+            w = self.__risk_parity_weights(cov)
+
+        with self.__lock:
+            self.__weights_cache[key] = w
+            if len(self.__weights_cache) > self.weights_cache_size:
+                self.__weights_cache.popitem(last=False)
+
+        return w
+
+    @staticmethod
+    def __regularise(cov: pd.DataFrame) -> np.ndarray:
+        """Make a pairwise covariance positive definite, by flooring its eigenvalues.
+
+        Returns:
+            np.ndarray: The regularised covariance, or None if there is no variance at all
+        """
+        scale = np.trace(cov.values) / max(len(cov), 1)
+        if not scale > 0:
+            return None
+
+        eigval, eigvec = np.linalg.eigh(cov.values)
+        return (eigvec * np.maximum(eigval, 1e-6 * scale)) @ eigvec.T
+
+    @staticmethod
+    def __min_variance_weights(cov: pd.DataFrame, tol: float = 1e-12) -> pd.Series:
+        """Long only minimum variance weights.
+
+        Solved with a primal active set method. The fully invested minimum variance portfolio of the stocks
+        held is solved in closed form, and we move towards it until a stock hits zero, which is dropped.
+        Once there, the dropped stocks whose marginal variance (C w)_i is below the portfolio variance are
+        added back, as the optimality conditions require, until none is.
+
+        Dropping one stock at a time from the whole universe takes hundreds of solves, so we start from
+        dropping all the short stocks at once until none is, which is long and usually close to the optimum.
+
+        Args:
+            cov (pd.DataFrame): The covariance of the stock returns
+            tol (float, optional): Tolerance on the optimality conditions. Defaults to 1e-12.
+
+        Returns:
+            pd.Series: The weights, equal if the covariance is degenerate
+        """
+        n = len(cov)
+        w = np.full(n, 1 / max(n, 1))
+        c = PortfolioPerformanceProvider.__regularise(cov)
+        if c is None:
+            return pd.Series(w, index=cov.index)
+
+        held = np.ones(n, dtype=bool)
+        while True:
+            x = np.linalg.solve(c[np.ix_(held, held)], np.ones(held.sum()))
+            if (x > 0).all():
+                break
+            held[np.flatnonzero(held)[x <= 0]] = False
+        w = np.zeros(n)
+        w[held] = x / x.sum()
+
+        for _ in range(10 * n):
+            x = np.zeros(n)
+            x[held] = np.linalg.solve(c[np.ix_(held, held)], np.ones(held.sum()))
+            x /= x.sum()
+
+            short = held & (x < 0)
+            if short.any():
+                # As far towards the solution as staying long allows, dropping the stock that hits zero
+                t = w[short] / (w[short] - x[short])
+                i = np.flatnonzero(short)[t.argmin()]
+                w = np.maximum(w + t.min() * (x - w), 0)
+                w[i] = 0
+                held[i] = False
+                continue
+
+            w = x
+            grad = c @ w
+            below = ~held & (grad - w @ grad < -tol * abs(w @ grad))
+            if not below.any():
+                break
+            held |= below
+
+        return pd.Series(w / w.sum(), index=cov.index)
+
+    @staticmethod
+    def __risk_parity_weights(cov: pd.DataFrame, max_iter: int = 100, tol: float = 1e-10) -> pd.Series:
+        """Equal risk contribution weights.
+
+        Minimising 1/2 y'Cy - sum(log(y)) with Newton steps, whose solution scaled to sum to one has equal
+        risk contributions.
+
+        Args:
+            cov (pd.DataFrame): The covariance of the stock returns
+            max_iter (int, optional): Maximum Newton iterations. Defaults to 100.
+            tol (float, optional): Tolerance on the gradient. Defaults to 1e-10.
+
+        Returns:
+            pd.Series: The weights, equal if the covariance is degenerate
+        """
+        c = PortfolioPerformanceProvider.__regularise(cov)
+        if c is None:
+            return pd.Series(1 / max(len(cov), 1), index=cov.index)
+
+        # Starting from inverse vol, which is the solution when there is no correlation
+        y = 1 / np.sqrt(np.diag(c))
+        for _ in range(max_iter):
+            grad = c @ y - 1 / y
+            if np.abs(grad * y).max() < tol:
+                break
+            step = np.linalg.solve(c + np.diag(1 / (y * y)), grad)
+            # Halving the step until we stay positive
+            t = 1
+            while (y - t * step <= 0).any():
+                t /= 2
+            y = y - t * step
+
+        return pd.Series(y / y.sum(), index=cov.index)
+
+    @staticmethod
+    def __apply_rebalancing(ret: pd.DataFrame,
+                            wgt: pd.DataFrame,
+                            rebalancing: Rebalancing,
+                            rebalance_dates: List[pd.Timestamp] = None):
+        """Reset to the target weights on rebalance days only, and let them drift with the returns in between.
+
+        Within each holding period, the drift of every stock is its cumulative return since the rebalance,
+        which is a cumulative product of the gross returns grouped by period, so no loop over days.
+
+        Args:
+            ret (pd.DataFrame): The daily stock returns
+            wgt (pd.DataFrame): The target weights on each day
+            rebalancing (Rebalancing): The rebalancing schedule
+            rebalance_dates (List[pd.Timestamp], optional): Custom rebalance dates, override the schedule.
+
+        Returns:
+            Tuple[pd.DataFrame, pd.Series]: The weights held on each day, and the turnover on each rebalance day
+        """
+        # Flag the rebalance days, the first day is always one as that is when we invest
+        if rebalance_dates is not None:
+            is_reb = np.zeros(len(ret), dtype=bool)
+            pos = ret.index.searchsorted(pd.DatetimeIndex(rebalance_dates))
+            is_reb[pos[pos < len(ret)]] = True
+        elif rebalancing == Rebalancing.DAILY:
+            is_reb = np.ones(len(ret), dtype=bool)
+        else:
+            periods = ret.index.to_period(REBALANCING_PERIODS[rebalancing])
+            is_reb = np.r_[True, periods[1:] != periods[:-1]]
+        is_reb[:1] = True
+
+        gross = ret.fillna(0) + 1
+        if not is_reb.all():
+            # Target weights set on the last rebalance, drifted by the growth since, up to the day before
+            segment = is_reb.cumsum()
+            growth = gross.groupby(segment).cumprod().groupby(segment).shift(1).fillna(1)
+            drift = wgt.fillna(0).loc[is_reb].reindex(ret.index, method='ffill') * growth
+            wgt = drift.div(drift.sum(1), axis=0)
+
+        # Turnover is half the absolute change from the drifted weights to the targets, on every rebalance
+        held = wgt.fillna(0)
+        pre_reb = (held * gross).shift(1)
+        pre_reb = pre_reb.div(pre_reb.sum(1), axis=0)
+        turnover = (held - pre_reb).abs().sum(1).div(2).loc[is_reb].iloc[1:]
+        turnover.name = 'Turnover'
+
+        return wgt, turnover
+
 
 if __name__ == "__main__":
     import logging
@@ -0,0 +1,180 @@
+import hashlib
+import threading
+
+import pandas as pd
+import numpy as np
+
+from typing import Dict
+from logging import getLogger
+from dataclasses import dataclass
+from collections import OrderedDict
+
+from lib.return_provider import ReturnProvider
+from lib.portfolio_performance import PortfolioPerformanceData
+
+
+log = getLogger(__name__)
+
+# Trading days in each of the rolling windows, by label
+DEFAULT_WINDOWS = {'1y': 252, '3y': 756}
+
+
+@dataclass
+class RiskAnalyticsData:
+    """Data struct to hold portfolio risk analytics results."""
+
+    rolling_vol: pd.DataFrame
+    rolling_sharpe: pd.DataFrame
+    rolling_beta: pd.DataFrame
+    drawdown: pd.Series
+
+    max_drawdown: float
+    max_drawdown_duration: int
+
+
+def _window_sums(x: np.ndarray, window: int) -> np.ndarray:
+    """Sums over the trailing window of each row, as differences of prefix sums.
+
+    Args:
+        x (np.ndarray): The values to sum, with no NaNs, one row per day
+        window (int): The number of rows in each window
+
+    Returns:
+        np.ndarray: The window sums, over fewer rows until a full window is available
+    """
+    prefix = np.zeros((len(x) + 1, ) + x.shape[1:])
+    np.cumsum(x, axis=0, out=prefix[1:])
+
+    ret = prefix[1:].copy()
+    if window < len(x):
+        ret[window:] -= prefix[1:len(x) + 1 - window]
+    return ret
+
+
+class RiskAnalyticsProvider:
+    """Calculates rolling risk analytics of a portfolio.
+
+    Every rolling statistic is derived from prefix sums computed once over the whole period, so each window
+    is just a subtraction. Results are cached by the portfolio series, as the UI asks for the same
+    portfolio over and over.
+    """
+    def __init__(self, rp: ReturnProvider = None, windows: Dict[str, int] = None,
+                 beta_window: int = 252, cache_size: int = 32):
+        # Injecting the dependencies here, but also instantiating if not provided for easier debugging
+        self.__rp = rp or ReturnProvider()
+        self.windows = windows or DEFAULT_WINDOWS
+        self.beta_window = beta_window
+        self.cache_size = cache_size
+        self.__cache = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def calculate_risk_analytics(self, perf: PortfolioPerformanceData) -> RiskAnalyticsData:
+        """Calculate rolling volatility, Sharpe ratio, drawdowns and stock betas of a portfolio.
+
+        Args:
+            perf (PortfolioPerformanceData): The portfolio performance to analyse
+
+        Returns:
+            RiskAnalyticsData: The risk analytics data, in an appropriate struct
+        """
+        cum_perf = perf.port_cum_perf
+        key = hashlib.sha1(cum_perf.index.values.tobytes() + cum_perf.values.astype(float).tobytes()
+                           + ','.join(perf.tickers).encode()).hexdigest()
+        with self.__lock:
+            if key in self.__cache:
+                self.__cache.move_to_end(key)
+                return self.__cache[key]
+
+        log.info('Calculating risk analytics for %d assets from %s to %s',
+                 len(perf.tickers), cum_perf.index.min(), cum_perf.index.max())
+
+        # Back to daily portfolio returns, the first day return is the first cumulative return
+        wealth = cum_perf.to_numpy(dtype=float) + 1
+        port_ret = np.r_[wealth[0] - 1, wealth[1:] / wealth[:-1] - 1]
+        stock_ret = self.__rp.get_stock_return_data(cum_perf.index.min(), cum_perf.index.max(), perf.tickers)
+        stock_ret = stock_ret.reindex(cum_perf.index)
+
+        ra = self.calculate_rolling_statistics(cum_perf.index, port_ret, stock_ret)
+        with self.__lock:
+            self.__cache[key] = ra
+            if len(self.__cache) > self.cache_size:
+                self.__cache.popitem(last=False)
+
+        return ra
+
+    def calculate_rolling_statistics(self, index: pd.DatetimeIndex, port_ret: np.ndarray,
+                                     stock_ret: pd.DataFrame) -> RiskAnalyticsData:
+        """Calculate the risk analytics from the daily returns, with no caching.
+
+        Args:
+            index (pd.DatetimeIndex): The dates of the returns
+            port_ret (np.ndarray): Daily portfolio returns
+            stock_ret (pd.DataFrame): Daily stock returns, aligned with the portfolio returns
+
+        Returns:
+            RiskAnalyticsData: The risk analytics data, in an appropriate struct
+        """
+        # Demeaning first, which leaves variances unchanged but keeps the prefix sums small
+        y = port_ret - port_ret.mean()
+        log_ret = np.log1p(port_ret)
+
+        vol = pd.DataFrame(index=index, columns=list(self.windows), dtype=float)
+        sharpe = pd.DataFrame(index=index, columns=list(self.windows), dtype=float)
+        for label, w in self.windows.items():
+            s1 = _window_sums(y, w)
+            s2 = _window_sums(y * y, w)
+            ann_vol = np.sqrt(np.maximum(s2 - s1 * s1 / w, 0) / (w - 1) * 252)
+            ann_ret = np.exp(_window_sums(log_ret, w) * 252 / w) - 1
+            # Only full windows for the portfolio
+            ann_vol[:w - 1] = np.nan
+            vol[label] = ann_vol
+            with np.errstate(divide='ignore', invalid='ignore'):
+                sharpe[label] = ann_ret / ann_vol
+
+        # Beta of each stock to the portfolio, over the days both have returns
+        x = stock_ret.to_numpy(dtype=float)
+        has_ret = ~np.isnan(x)
+        # The mean over the days with returns, stocks with none in the period just have no beta
+        x = np.where(has_ret, x, 0)
+        x = np.where(has_ret, x - x.sum(axis=0) / np.maximum(has_ret.sum(axis=0), 1), 0)
+        yx = np.where(has_ret, y[:, None], 0)
+        w = self.beta_window
+        n = _window_sums(has_ret.astype(float), w)
+        sx = _window_sums(x, w)
+        sy = _window_sums(yx, w)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = _window_sums(x * yx, w) - sx * sy / n
+            var = _window_sums(yx * yx, w) - sy * sy / n
+            beta = np.where(n >= w // 2, cov / var, np.nan)
+        beta = pd.DataFrame(beta, index=index, columns=stock_ret.columns)
+
+        # Drawdowns from the running peak, and the longest time spent below a peak
+        wealth = np.cumprod(port_ret + 1)
+        peak = np.maximum.accumulate(wealth)
+        drawdown = pd.Series(wealth / peak - 1, index=index, name='Drawdown')
+        days = np.arange(len(wealth))
+        last_peak = np.maximum.accumulate(np.where(wealth >= peak, days, 0))
+
+        return RiskAnalyticsData(rolling_vol=vol, rolling_sharpe=sharpe, rolling_beta=beta, drawdown=drawdown,
+                                 max_drawdown=drawdown.min(),
+                                 max_drawdown_duration=int((days - last_peak).max()))
+
+
+if __name__ == "__main__":
+    import time
+    import logging
+    logging.basicConfig(format='%(asctime)s: %(name)s|%(levelname)s|%(message)s',
+                        datefmt='%Y-%m-%d %H:%M:%S')
+    logging.getLogger(__name__).setLevel(logging.INFO)
+
+    # Timing a 500 stock, 20 year portfolio on random returns
+    rng = np.random.default_rng(0)
+    idx = pd.bdate_range(pd.Timestamp(2004, 1, 1), periods=20 * 252)
+    stock_ret = pd.DataFrame(rng.normal(0.0003, 0.02, (len(idx), 500)), index=idx)
+    stock_ret.iloc[:1000, :100] = np.nan
+
+    rap = RiskAnalyticsProvider()
+    start = time.perf_counter()
+    ra = rap.calculate_rolling_statistics(idx, stock_ret.mean(axis=1).to_numpy(), stock_ret)
+    print(f'Calculated in {time.perf_counter() - start:.3f}s')
+    print(ra.rolling_vol.tail(), ra.max_drawdown, ra.max_drawdown_duration)
@@ -4,10 +4,12 @@ Standing data are from Wiki S&P 500 page (https://en.wikipedia.org/wiki/List_of_
 """
 
 import os
+import hashlib
+import threading
 
 import pandas as pd
 
-from typing import Iterator, List
+from typing import Any, Iterator, List, Tuple
 from logging import getLogger
 from functools import lru_cache
 
@@ -27,6 +29,10 @@ class StockDataRepository:
         """
         self.__data_dir = data_dir
         self.__standing_data_file = standing_data_file
+        self.__data_version = None
+        self.__lock = threading.Lock()
+        # Bumped whenever the data on disk change, so that anything built on the data knows to rebuild
+        self.data_generation = 0
 
     def get_stocks_with_prices(self) -> Iterator[str]:
         """Get the tickers for stocks that have prices in the data dir.
@@ -40,6 +46,45 @@ class StockDataRepository:
 
             yield f[:-4]
 
+    def get_data_version(self) -> Tuple[str, pd.Timestamp]:
+        """Get a version tag and last modification time for the data in the data dir.
+
+        Only file metadata is read, so this is cheap enough to call on every request. If the data have
+        changed since the last call, the cached data are dropped, so that what is served next matches
+        the version returned.
+
+        Returns:
+            Tuple[str, pd.Timestamp]: A hash of the names, sizes and modification times of the CSVs,
+                and the latest modification time (UTC) across them.
+        """
+        h = hashlib.sha1()
+        last_modified = 0
+        for f in sorted(os.listdir(self.__data_dir)):
+            if not f.endswith('.csv'):
+                continue
+
+            st = os.stat(os.path.join(self.__data_dir, f))
+            h.update(f'{f}:{st.st_size}:{st.st_mtime_ns};'.encode())
+            last_modified = max(last_modified, st.st_mtime)
+
+        version = h.hexdigest()
+        with self.__lock:
+            if self.__data_version is not None and version != self.__data_version:
+                log.info('Data in %s changed, dropping cached data', self.__data_dir)
+                # The caches are on the class, so this clears them for every instance
+                StockDataRepository.get_stock_price_data.cache_clear()
+                StockDataRepository.__standing_data.fget.cache_clear()
+                StockDataRepository.__indexed_standing_data.fget.cache_clear()
+                self.data_generation += 1
+            self.__data_version = version
+
+        return version, pd.Timestamp(last_modified, unit='s', tz='UTC')
+
+    def __init_data_version(self):
+        """Record the version of the data when first loaded, to tell when the cached data go stale."""
+        if self.__data_version is None:
+            self.get_data_version()
+
     @lru_cache(maxsize=10)
     def get_stock_price_data(self, ticker: str) -> pd.DataFrame:
         """Return price data for stock. Stock must have a CSV in the data dir.
@@ -52,6 +97,7 @@ class StockDataRepository:
         """
         d = os.path.join(self.__data_dir, f'{ticker}.csv')
         log.info('Loading price for %s from %s', ticker, d)
+        self.__init_data_version()
 
         return pd.read_csv(d, parse_dates=['Date'])
 
@@ -65,11 +111,68 @@ class StockDataRepository:
         """
         d = os.path.join(self.__data_dir, self.__standing_data_file)
         log.info('Loading standing data from %s', d)
+        self.__init_data_version()
 
         ret = pd.read_csv(d)
         del ret['Date added']  # Date added to S&P500, irrelevant column
         return ret
 
+    @property
+    @lru_cache(maxsize=1)
+    def __indexed_standing_data(self) -> pd.DataFrame:
+        """Private property to hold the standing data indexed by symbol, for quick selection of tickers.
+
+        Returns:
+            pd.DataFrame: All standing data available, indexed and sorted by symbol.
+        """
+        return self.__standing_data.set_index('Symbol', drop=False).sort_index()
+
+    def query_stock_standing_data(self,
+                                  tickers: List[str],
+                                  filters: List[Tuple[str, str, Any]] = None,
+                                  sort_by: List[Tuple[str, bool]] = None,
+                                  page: int = 0,
+                                  page_size: int = 20) -> Tuple[pd.DataFrame, int]:
+        """Get one page of the standing data for a list of stocks, filtered and sorted.
+
+        Args:
+            tickers (List[str]): The tickers to get standing data for.
+            filters (List[Tuple[str, str, Any]], optional): Column, operator and value of each filter. The operators
+                are eq, ne, lt, le, gt, ge and contains. Defaults to None.
+            sort_by (List[Tuple[str, bool]], optional): Column and whether ascending, for each sort. Defaults to None.
+            page (int, optional): The page to return, starting from 0. Defaults to 0.
+            page_size (int, optional): Number of rows on each page. Defaults to 20.
+
+        Returns:
+            Tuple[pd.DataFrame, int]: The standing data on the page, and the number of rows after filtering.
+
+        Raises:
+            ValueError: If a filter or sort is on a column not in the standing data
+        """
+        ss = self.__indexed_standing_data
+        unknown = {c for c, _, _ in filters or []}.union(c for c, _ in sort_by or []).difference(ss.columns)
+        if unknown:
+            raise ValueError(f'Unknown standing data columns: {", ".join(sorted(unknown))}')
+
+        ss = ss.loc[ss.index.isin(tickers)]
+
+        for col, op, value in filters or []:
+            values = ss[col]
+            if op == 'contains':
+                mask = values.astype(str).str.contains(str(value), case=False, regex=False)
+            elif isinstance(value, (int, float)):
+                # Comparing numbers as numbers, leaving out what does not parse as one
+                mask = getattr(pd.to_numeric(values, errors='coerce'), op)(value)
+            else:
+                mask = getattr(values.astype(str), op)(value)
+            ss = ss.loc[mask]
+
+        if sort_by:
+            cols, ascending = zip(*sort_by)
+            ss = ss.sort_values(list(cols), ascending=list(ascending), kind='stable')
+
+        return ss.iloc[page * page_size:(page + 1) * page_size].reset_index(drop=True), len(ss)
+
     def get_stock_standing_data(self, tickers: List[str]) -> pd.Series:
         """Get standing data for a stock.
 
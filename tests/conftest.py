@@ -1,11 +1,14 @@
 import pytest
 
+import numpy as np
 import pandas as pd
 
 from unittest.mock import Mock
 from typing import List
 
 from lib.return_provider import ReturnProvider
+from lib.stock_data_repository import StockDataRepository
+from lib.covariance_engine import CovarianceEngine
 from lib.portfolio_performance import PortfolioPerformanceProvider
 
 
@@ -26,9 +29,24 @@ def mock_sdr(tickers):
                                                                'Adj Close': [1] * len(idx)})
     sdr.get_stock_standing_data.return_value = pd.DataFrame({'Symbol': tickers,
                                                              'GICS Sector': ['IT', 'IT', 'IT2']})
+    sdr.get_data_version.return_value = ('v1', pd.Timestamp(2024, 1, 1, tz='UTC'))
 
     return sdr
 
+@pytest.fixture
+def sdr(tmp_path) -> StockDataRepository:
+    """Repository on a small standing data file."""
+    pd.DataFrame({'Symbol': ['MSFT', 'AAPL', 'GOOG', 'BA', 'XOM'],
+                  'Security': ['Microsoft', 'Apple Inc.', 'Alphabet Inc.', 'Boeing', 'ExxonMobil'],
+                  'GICS Sector': ['Information Technology', 'Information Technology', 'Communication Services',
+                                  'Industrials', 'Energy'],
+                  'Date added': '01/01/2000',
+                  'CIK': [789019, 320193, 1652044, 12927, 34088],
+                  'Founded': ['1975', '1977', '1998', '1916', '1999 (1870)']}
+                 ).to_csv(tmp_path / 'standing_data.csv', index=False)
+
+    return StockDataRepository(data_dir=str(tmp_path))
+
 @pytest.fixture
 def rp(mock_sdr) -> ReturnProvider:
     """Providing a Return Provider implementation that uses the mocl."""
@@ -37,3 +55,34 @@ def rp(mock_sdr) -> ReturnProvider:
 @pytest.fixture
 def ppp(mock_sdr, rp) -> PortfolioPerformanceProvider:
     return PortfolioPerformanceProvider(rp=rp, sdr=mock_sdr)
+
+@pytest.fixture
+def trending_ppp(mock_sdr, tickers) -> PortfolioPerformanceProvider:
+    """Portfolio performance provider on prices where the first ticker grows daily and the rest are flat."""
+    idx = pd.date_range(pd.Timestamp(1980, 1, 1), pd.Timestamp(2030, 1, 1))
+    growth = pd.Series(1.001, index=range(len(idx))).cumprod()
+    prices = {t: pd.DataFrame(data={'Date': idx, 'Adj Close': growth if t == tickers[0] else 1})
+              for t in tickers}
+    mock_sdr.get_stock_price_data.return_value = None
+    mock_sdr.get_stock_price_data.side_effect = prices.get
+
+    return PortfolioPerformanceProvider(rp=ReturnProvider(sdr=mock_sdr), sdr=mock_sdr)
+
+@pytest.fixture
+def random_rp(mock_sdr, tickers) -> ReturnProvider:
+    """Return provider on random walk prices, with the last ticker starting later than the rest."""
+    rng = np.random.default_rng(0)
+    idx = pd.bdate_range(pd.Timestamp(2000, 1, 1), pd.Timestamp(2020, 1, 1))
+    common = rng.normal(0, 0.01, len(idx))
+    prices = {t: pd.DataFrame(data={'Date': idx,
+                                    'Adj Close': np.cumprod(1 + common + rng.normal(0, 0.01 * (i + 1), len(idx)))})
+              for i, t in enumerate(tickers)}
+    prices[tickers[-1]] = prices[tickers[-1]].iloc[2000:]
+    mock_sdr.get_stock_price_data.return_value = None
+    mock_sdr.get_stock_price_data.side_effect = prices.get
+
+    return ReturnProvider(sdr=mock_sdr)
+
+@pytest.fixture
+def random_ppp(mock_sdr, random_rp) -> PortfolioPerformanceProvider:
+    return PortfolioPerformanceProvider(rp=random_rp, sdr=mock_sdr, ce=CovarianceEngine(rp=random_rp))
@@ -0,0 +1,149 @@
+import io
+import json
+
+import pytest
+import pyarrow as pa
+
+from flask import Flask
+from typing import List
+
+from api.portfolio_api import PortfolioApi, ARROW_MIMETYPE
+
+
+PARAMS = 'start_date=2010-01-01&end_date=2020-01-01'
+
+
+@pytest.fixture
+def client(rp, ppp, mock_sdr, tickers: List[str]):
+    server = Flask(__name__)
+    # Small chunks, so that responses span several of them
+    PortfolioApi(rp, ppp, mock_sdr, server, tickers, chunk_rows=1000)
+    return server.test_client()
+
+def test_returns_json(client, tickers: List[str]):
+    resp = client.get(f'/api/returns?{PARAMS}')
+
+    assert resp.status_code == 200
+    assert resp.json['columns'] == ['Date'] + tickers
+    assert len(resp.json['data']) == 3653
+
+def test_returns_tickers(client):
+    resp = client.get(f'/api/cumulative-returns?{PARAMS}&tickers=msft')
+
+    assert resp.json['columns'] == ['Date', 'MSFT']
+
+def test_returns_tickers_repeated(client):
+    resp = client.get(f'/api/returns?{PARAMS}&tickers=MSFT,msft,,AAPL')
+
+    assert resp.json['columns'] == ['Date', 'MSFT', 'AAPL']
+
+def test_returns_tickers_blank(client, tickers: List[str]):
+    resp = client.get(f'/api/returns?{PARAMS}&tickers=,')
+
+    assert resp.json['columns'] == ['Date'] + tickers
+
+def test_returns_arrow(client, tickers: List[str]):
+    resp = client.get(f'/api/returns?{PARAMS}', headers={'Accept': ARROW_MIMETYPE})
+    table = pa.ipc.open_stream(io.BytesIO(resp.data)).read_all()
+
+    assert resp.mimetype == ARROW_MIMETYPE
+    assert table.column_names == ['Date'] + tickers
+    assert table.num_rows == 3653
+
+def test_returns_not_modified(client):
+    resp = client.get(f'/api/returns?{PARAMS}')
+    etag = resp.headers['ETag']
+
+    assert client.get(f'/api/returns?{PARAMS}', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get(f'/api/returns?{PARAMS}&tickers=MSFT', headers={'If-None-Match': etag}).status_code == 200
+    assert client.get(f'/api/returns?{PARAMS}',
+                      headers={'If-Modified-Since': resp.headers['Last-Modified']}).status_code == 304
+
+def test_not_modified_skips_calculation(client, mock_sdr):
+    etag = client.get(f'/api/returns?{PARAMS}').headers['ETag']
+    mock_sdr.get_stock_price_data.reset_mock()
+    client.get(f'/api/returns?{PARAMS}', headers={'If-None-Match': etag})
+
+    mock_sdr.get_stock_price_data.assert_not_called()
+
+def test_etag_follows_data_version(client, mock_sdr):
+    etag = client.get(f'/api/returns?{PARAMS}').headers['ETag']
+    mock_sdr.get_data_version.return_value = ('v2', mock_sdr.get_data_version.return_value[1])
+
+    assert client.get(f'/api/returns?{PARAMS}', headers={'If-None-Match': etag}).status_code == 200
+
+def test_portfolio_performance(client, tickers: List[str]):
+    resp = client.get(f'/api/portfolio-performance?{PARAMS}&weighting=EQUAL')
+
+    assert resp.json['tickers'] == tickers
+    assert resp.json['port_ann_ret'] == 0
+
+def test_portfolio_performance_not_finite(client):
+    # A single day has no volatility, and so no Sharpe ratio
+    resp = client.get('/api/portfolio-performance?start_date=2020-01-01&end_date=2020-01-01')
+    summary = json.loads(resp.data, parse_constant=lambda c: pytest.fail(f'Invalid JSON constant {c}'))
+
+    assert summary['port_ann_vol'] is None
+    assert summary['port_sharpe_ratio'] is None
+
+def test_portfolio_performance_no_vol_history(client):
+    resp = client.get('/api/portfolio-performance?start_date=1900-01-01&end_date=1990-01-01&weighting=INVERSE_VOL')
+
+    assert resp.status_code == 200
+
+def test_portfolio_performance_table(client):
+    resp = client.get(f'/api/portfolio-performance/sector_weights?{PARAMS}')
+
+    assert resp.json['columns'] == ['Date', 'IT', 'IT2']
+
+def test_portfolio_performance_rebalancing(client):
+    resp = client.get(f'/api/portfolio-performance?{PARAMS}&rebalancing=monthly')
+
+    assert resp.json['rebalancing'] == 'MONTHLY'
+    assert resp.json['rebalance_dates'] is None
+
+def test_portfolio_performance_rebalance_dates(client):
+    resp = client.get(f'/api/portfolio-performance?{PARAMS}&rebalance_dates=2012-01-01,2011-01-01')
+
+    assert resp.json['rebalancing'] is None
+    assert resp.json['rebalance_dates'] == ['2011-01-01', '2012-01-01']
+
+def test_portfolio_performance_turnover(client):
+    resp = client.get(f'/api/portfolio-performance/turnover?{PARAMS}&rebalance_dates=2012-01-01,2011-01-01')
+
+    assert resp.json['columns'] == ['Date', 'Turnover']
+    assert [r[0][:10] for r in resp.json['data']] == ['2011-01-01', '2012-01-01']
+
+@pytest.mark.parametrize('url', ['/api/returns?start_date=2010-01-01',
+                                 '/api/returns?start_date=nodate&end_date=2020-01-01',
+                                 '/api/returns?start_date=&end_date=2020-01-01',
+                                 '/api/returns?start_date=2020-01-01&end_date=2010-01-01',
+                                 f'/api/returns?{PARAMS}&tickers=XXX',
+                                 f'/api/returns?{PARAMS}&format=xml',
+                                 f'/api/portfolio-performance?{PARAMS}&weighting=XXX',
+                                 f'/api/portfolio-performance?{PARAMS}&rebalancing=XXX',
+                                 f'/api/portfolio-performance?{PARAMS}&rebalance_dates=nodate',
+                                 f'/api/portfolio-performance?{PARAMS}&rebalance_dates=2011-01-01,',
+                                 f'/api/portfolio-performance/turnover?{PARAMS}&rebalance_dates=2011-01-01,,2011-06-01'])
+def test_bad_request(client, url: str):
+    assert client.get(url).status_code == 400
+
+def test_returns_no_trading_days(client):
+    resp = client.get('/api/returns?start_date=2031-01-01&end_date=2031-01-05')
+
+    assert resp.status_code == 200
+    assert resp.json['data'] == []
+
+@pytest.mark.parametrize('url', ['/api/portfolio-performance?start_date=2031-01-01&end_date=2031-01-05',
+                                 '/api/portfolio-performance/stock_weights?start_date=2031-01-01&end_date=2031-01-05'])
+def test_portfolio_performance_no_trading_days(client, url: str):
+    assert client.get(url).status_code == 400
+
+def test_unknown_table(client):
+    assert client.get(f'/api/portfolio-performance/unknown?{PARAMS}').status_code == 404
+
+
+if __name__ == "__main__":
+    import pytest
+
+    pytest.main()
@@ -0,0 +1,72 @@
+import pytest
+
+from dash import Dash
+from typing import List
+
+from components.stock_data_table import StockDataTable, parse_filter_query
+from lib.stock_data_repository import StockDataRepository
+
+
+TICKERS = ['MSFT', 'AAPL', 'GOOG', 'BA', 'XOM']
+
+
+@pytest.fixture
+def sdt(sdr: StockDataRepository) -> StockDataTable:
+    return StockDataTable(sdr, Dash(__name__), TICKERS, page_size=2)
+
+def test_parse_filter_query_contains_number():
+    # Dash's default operator on these columns, matched as typed rather than as a float
+    assert parse_filter_query('{CIK} contains 7890') == [('CIK', 'contains', '7890')]
+
+@pytest.mark.parametrize('op, expected', [('>=', 'ge'), ('<=', 'le'), ('<', 'lt'), ('>', 'gt'), ('!=', 'ne'),
+                                          ('=', 'eq'), ('ge', 'ge'), ('le', 'le'), ('lt', 'lt'), ('gt', 'gt'),
+                                          ('ne', 'ne'), ('eq', 'eq')])
+def test_parse_filter_query_comparison(op: str, expected: str):
+    assert parse_filter_query(f'{{CIK}} {op} 500000') == [('CIK', expected, 500000.0)]
+
+@pytest.mark.parametrize('value', ['"1975"', "'1975'", '`1975`'])
+def test_parse_filter_query_quoted(value: str):
+    assert parse_filter_query(f'{{Founded}} = {value}') == [('Founded', 'eq', '1975')]
+
+def test_parse_filter_query_text():
+    assert parse_filter_query('{GICS Sector} icontains tech && {Security} = Boeing') == [
+        ('GICS Sector', 'contains', 'tech'), ('Security', 'eq', 'Boeing')]
+
+@pytest.mark.parametrize('filter_query', ['', None, 'CIK > 5', '{CIK} between 5', '{CIK}'])
+def test_parse_filter_query_unparseable(filter_query: str):
+    assert parse_filter_query(filter_query) == []
+
+def test_get_page(sdt: StockDataTable):
+    records, pages, page = sdt.get_page(1, 2, [{'column_id': 'CIK', 'direction': 'desc'}], '')
+
+    assert [r['Symbol'] for r in records] == ['AAPL', 'XOM']
+    assert pages == 3
+    assert page == 1
+
+@pytest.mark.parametrize('page_current, filter_query, symbols, pages, page', [
+    (0, '{CIK} contains 7890', ['MSFT'], 1, 0),
+    (0, '{CIK} > 20000', ['AAPL', 'GOOG'], 2, 0),
+    (0, '{Founded} contains 2050', [], 1, 0),
+    # Past the last page after filtering, e.g. filtering from a later page
+    (10, '{CIK} > 20000', ['MSFT', 'XOM'], 2, 1),
+    (10, '{CIK} contains 7890', ['MSFT'], 1, 0)])
+def test_get_page_filters(sdt: StockDataTable, page_current: int, filter_query: str, symbols: List[str],
+                          pages: int, page: int):
+    records, n, p = sdt.get_page(page_current, 2, [], filter_query)
+
+    assert [r['Symbol'] for r in records] == symbols
+    assert n == pages
+    assert p == page
+
+def test_get_page_unknown_column(sdt: StockDataTable):
+    records, pages, _ = sdt.get_page(0, 2, [{'column_id': 'Nothing', 'direction': 'asc'}],
+                                     '{Nothing} > 5 && {Date added} contains 2000')
+
+    assert len(records) == 2
+    assert pages == 3
+
+
+if __name__ == "__main__":
+    import pytest
+
+    pytest.main()
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from typing import List
+
+from lib.return_provider import ReturnProvider
+from lib.covariance_engine import CovarianceEngine
+
+
+@pytest.mark.parametrize('max_memory_mb', [256, 0])
+@pytest.mark.parametrize('from_date, to_date', [(pd.Timestamp(2000, 1, 1), pd.Timestamp(2020, 1, 1)),
+                                                (pd.Timestamp(2003, 2, 3), pd.Timestamp(2011, 7, 8)),
+                                                (pd.Timestamp(2010, 1, 1), pd.Timestamp(2010, 1, 20))])
+def test_get_covariance(random_rp, tickers: List[str], max_memory_mb: int, from_date, to_date):
+    ce = CovarianceEngine(rp=random_rp, max_memory_mb=max_memory_mb)
+    ret = random_rp.get_stock_return_data(pd.Timestamp.min, pd.Timestamp.max).loc[from_date:to_date]
+
+    assert np.allclose(ce.get_covariance(from_date, to_date), ret.cov(), equal_nan=True)
+    assert np.allclose(ce.get_correlation(from_date, to_date), ret.corr(), equal_nan=True)
+
+def test_get_covariance_tickers(random_rp, tickers: List[str]):
+    ce = CovarianceEngine(rp=random_rp)
+    cov = ce.get_covariance(pd.Timestamp(2010, 1, 1), pd.Timestamp(2011, 1, 1), tickers[::-1])
+
+    assert cov.index.tolist() == tickers[::-1]
+    assert cov.columns.tolist() == tickers[::-1]
+
+def test_get_covariance_min_periods(random_rp, tickers: List[str]):
+    ce = CovarianceEngine(rp=random_rp)
+    # The last ticker starts in 2007
+    cov = ce.get_covariance(pd.Timestamp(2006, 1, 1), pd.Timestamp(2008, 1, 1), min_periods=300)
+
+    assert cov[tickers[-1]].isna().all()
+    assert cov[tickers[0]].iloc[:-1].notna().all()
+
+def test_get_covariance_rebuilds_on_data_change(mock_sdr, tickers: List[str]):
+    idx = pd.bdate_range(pd.Timestamp(2010, 1, 1), pd.Timestamp(2011, 1, 1))
+    prices = {t: pd.DataFrame({'Date': idx, 'Adj Close': np.linspace(1, 2, len(idx)) ** (i + 1)})
+              for i, t in enumerate(tickers)}
+    mock_sdr.get_stock_price_data.side_effect = lambda t: prices[t]
+    mock_sdr.data_generation = 0
+    ce = CovarianceEngine(rp=ReturnProvider(sdr=mock_sdr), sdr=mock_sdr)
+    before = ce.get_covariance(idx[0], idx[-1])
+
+    prices = {t: p.assign(**{'Adj Close': p['Adj Close'] ** 2}) for t, p in prices.items()}
+    assert ce.get_covariance(idx[0], idx[-1]).equals(before)
+
+    mock_sdr.data_generation = 1
+    assert not np.allclose(ce.get_covariance(idx[0], idx[-1]), before)
+
+
+if __name__ == "__main__":
+    import pytest
+
+    pytest.main()
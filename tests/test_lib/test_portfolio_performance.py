@@ -1,8 +1,12 @@
+import numpy as np
 import pandas as pd
+import pytest
 
 from typing import List
+from unittest.mock import Mock
+from concurrent.futures import ThreadPoolExecutor
 
-from lib.portfolio_performance import PortfolioPerformanceProvider, Weighting
+from lib.portfolio_performance import PortfolioPerformanceProvider, Rebalancing, Weighting
 
 
 def test_calculate_portfolio_performance_weighting(ppp: PortfolioPerformanceProvider, tickers: List[str]):
@@ -93,6 +97,186 @@ def test_calculate_portfolio_performance_sector_weights(ppp: PortfolioPerformanc
 
     assert (perf.sector_weights.sum(1) == 1).all()
 
+def test_calculate_portfolio_performance_weekly(trending_ppp: PortfolioPerformanceProvider, tickers: List[str]):
+    from_date = pd.Timestamp(2010, 1, 1)
+    to_date = pd.Timestamp(2011, 1, 1)
+    perf = trending_ppp.calculate_portfolio_performance(from_date, to_date, tickers, Weighting.EQUAL,
+                                                        Rebalancing.WEEKLY)
+    wgt = perf.stock_weights
+
+    # Prices are daily, so the first trading day of each week is the Monday, after the initial investment
+    assert perf.turnover.index.equals(pd.date_range(from_date, to_date, freq='W-MON'))
+    assert (perf.turnover > 0).all()
+    assert (wgt.loc[wgt.index.dayofweek == 0, tickers[0]].round(10) == round(1/len(tickers), 10)).all()
+    assert (wgt.loc[wgt.index.dayofweek == 3, tickers[0]] > 1/len(tickers)).all()
+
+def test_calculate_portfolio_performance_turnover_dates(ppp: PortfolioPerformanceProvider, tickers: List[str]):
+    from_date = pd.Timestamp(2010, 1, 1)
+    to_date = pd.Timestamp(2020, 1, 1)
+    perf = ppp.calculate_portfolio_performance(from_date, to_date, tickers, Weighting.EQUAL, Rebalancing.QUARTERLY)
+
+    # First quarter is the initial investment
+    assert len(perf.turnover) == 40
+    assert (perf.turnover.index.month.isin([1, 4, 7, 10])).all()
+    assert (perf.turnover == 0).all()
+
+def test_calculate_portfolio_performance_daily_weights_fixed(trending_ppp: PortfolioPerformanceProvider,
+                                                             tickers: List[str]):
+    from_date = pd.Timestamp(2010, 1, 1)
+    to_date = pd.Timestamp(2011, 1, 1)
+    perf = trending_ppp.calculate_portfolio_performance(from_date, to_date, tickers, Weighting.EQUAL)
+
+    assert (perf.stock_weights == 1/len(tickers)).all().all()
+    # The first day has no return, so nothing to rebalance on the second
+    assert (perf.turnover.iloc[1:] > 0).all()
+
+def test_calculate_portfolio_performance_monthly_weights_drift(trending_ppp: PortfolioPerformanceProvider,
+                                                               tickers: List[str]):
+    from_date = pd.Timestamp(2010, 1, 1)
+    to_date = pd.Timestamp(2011, 1, 1)
+    perf = trending_ppp.calculate_portfolio_performance(from_date, to_date, tickers, Weighting.EQUAL,
+                                                        Rebalancing.MONTHLY)
+    wgt = perf.stock_weights
+
+    assert (wgt.sum(1).round(10) == 1).all()
+    # Back to target weights on the first of each month, and drifting towards the growing stock after
+    assert (wgt.loc[wgt.index.day == 1, tickers[0]].round(10) == round(1/len(tickers), 10)).all()
+    assert (wgt.loc[wgt.index.day == 15, tickers[0]] > 1/len(tickers)).all()
+    assert len(perf.turnover) == 12
+
+def test_calculate_portfolio_performance_buy_and_hold(trending_ppp: PortfolioPerformanceProvider,
+                                                      tickers: List[str]):
+    from_date = pd.Timestamp(2010, 1, 1)
+    to_date = pd.Timestamp(2011, 1, 1)
+    perf = trending_ppp.calculate_portfolio_performance(from_date, to_date, tickers, Weighting.EQUAL,
+                                                        rebalance_dates=[from_date])
+    days = len(perf.port_cum_perf) - 1
+
+    assert abs(perf.port_cum_perf.iloc[-1] - (1.001 ** days - 1) / len(tickers)) < 1e-10
+    assert perf.turnover.empty
+    assert perf.rebalancing is None
+    assert perf.rebalance_dates == [from_date]
+
+@pytest.mark.parametrize('weighting', [Weighting.MIN_VARIANCE, Weighting.RISK_PARITY])
+def test_calculate_portfolio_performance_covariance_weights(random_ppp: PortfolioPerformanceProvider,
+                                                            tickers: List[str], weighting: Weighting):
+    from_date = pd.Timestamp(2005, 1, 1)
+    to_date = pd.Timestamp(2011, 1, 1)
+    perf = random_ppp.calculate_portfolio_performance(from_date, to_date, tickers, weighting)
+    wgt = perf.stock_weights
+
+    assert np.allclose(wgt.sum(1), 1)
+    assert (wgt.fillna(0) >= 0).all().all()
+    # The last ticker starts in late 2007 and needs half the window of history, the first has the lowest volatility
+    assert (wgt.loc[:'2008-12-31', tickers[-1]].fillna(0) == 0).all()
+    assert (wgt.loc['2010-01-01':, tickers[-1]] > 0).all()
+    assert (wgt.loc['2010-01-01':].idxmax(axis=1) == tickers[0]).all()
+
+def test_calculate_portfolio_performance_min_variance_long_only(mock_sdr, rp, tickers: List[str]):
+    # Unconstrained, the second stock is short. Dropping it leaves the third short too, but the long only
+    # optimum holds the first and the third, as the second's marginal variance 1.02 is above the 0.64 of the portfolio
+    ce = Mock()
+    ce.get_covariance.return_value = pd.DataFrame([[1, .45, .4], [.45, 2.8, 1.4], [.4, 1.4, .8]],
+                                                  index=tickers, columns=tickers)
+    ppp = PortfolioPerformanceProvider(rp=rp, sdr=mock_sdr, ce=ce)
+    perf = ppp.calculate_portfolio_performance(pd.Timestamp(2015, 1, 1), pd.Timestamp(2015, 1, 2), tickers,
+                                               Weighting.MIN_VARIANCE)
+
+    assert np.allclose(perf.stock_weights.iloc[0], [.4, 0, .6], atol=1e-6)
+
+def test_calculate_portfolio_performance_covariance_weights_cached(mock_sdr, rp, tickers: List[str]):
+    ce = Mock()
+    ce.get_covariance.return_value = pd.DataFrame(np.diag([1., 2., 3.]), index=tickers, columns=tickers)
+    ppp = PortfolioPerformanceProvider(rp=rp, sdr=mock_sdr, ce=ce)
+    ppp.calculate_portfolio_performance(pd.Timestamp(2015, 1, 1), pd.Timestamp(2015, 6, 30), tickers,
+                                        Weighting.MIN_VARIANCE)
+    assert ce.get_covariance.call_count == 6
+
+    # Only the months not covered already
+    ppp.calculate_portfolio_performance(pd.Timestamp(2015, 3, 1), pd.Timestamp(2015, 9, 30), tickers,
+                                        Weighting.MIN_VARIANCE)
+    assert ce.get_covariance.call_count == 9
+
+    # But all again on new data
+    mock_sdr.get_data_version.return_value = ('v2', mock_sdr.get_data_version.return_value[1])
+    ppp.calculate_portfolio_performance(pd.Timestamp(2015, 3, 1), pd.Timestamp(2015, 9, 30), tickers,
+                                        Weighting.MIN_VARIANCE)
+    assert ce.get_covariance.call_count == 16
+
+def test_calculate_portfolio_performance_risk_parity(random_ppp: PortfolioPerformanceProvider, random_rp,
+                                                     tickers: List[str]):
+    from_date = pd.Timestamp(2015, 1, 1)
+    to_date = pd.Timestamp(2015, 1, 2)
+    perf = random_ppp.calculate_portfolio_performance(from_date, to_date, tickers, Weighting.RISK_PARITY)
+    wgt = perf.stock_weights.iloc[0]
+    ret = random_rp.get_stock_return_data(pd.Timestamp(2012, 1, 3), pd.Timestamp(2014, 12, 31), tickers)
+    risk = wgt * (ret.cov() @ wgt)
+
+    assert np.allclose(risk / risk.sum(), 1/len(tickers), atol=1e-3)
+
+def test_calculate_portfolio_performance_covariance_degenerate(ppp: PortfolioPerformanceProvider, tickers: List[str]):
+    from_date = pd.Timestamp(2010, 1, 1)
+    to_date = pd.Timestamp(2020, 1, 1)
+    perf = ppp.calculate_portfolio_performance(from_date, to_date, tickers, Weighting.MIN_VARIANCE)
+
+    # No variance on flat prices, so back to equal weights
+    assert (perf.stock_weights == 1/len(tickers)).all().all()
+
+def test_calculate_portfolio_performance_no_trading_days(ppp: PortfolioPerformanceProvider, tickers: List[str]):
+    with pytest.raises(ValueError):
+        ppp.calculate_portfolio_performance(pd.Timestamp(2031, 1, 1), pd.Timestamp(2031, 1, 5), tickers, Weighting.EQUAL)
+
+def test_calculate_portfolio_performance_inverse_vol_no_history(random_ppp: PortfolioPerformanceProvider,
+                                                                 tickers: List[str]):
+    # Prices start in 2000, and vols need half the window of history
+    perf = random_ppp.calculate_portfolio_performance(pd.Timestamp(1990, 1, 1), pd.Timestamp(2004, 1, 1), tickers,
+                                                      Weighting.INVERSE_VOL)
+    wgt = perf.stock_weights
+
+    assert wgt.loc[:'2001-06-01'].isna().all().all()
+    assert np.allclose(wgt.loc['2003-01-01':].sum(1), 1)
+    assert np.isfinite(perf.port_cum_perf).all()
+
+def test_calculate_portfolio_performance_cached(ppp: PortfolioPerformanceProvider, mock_sdr, tickers: List[str]):
+    perf = ppp.calculate_portfolio_performance(pd.Timestamp(2010, 1, 1), pd.Timestamp(2011, 1, 1), tickers,
+                                               Weighting.EQUAL, Rebalancing.MONTHLY)
+    mock_sdr.get_stock_price_data.reset_mock()
+
+    # Dates as strings, like from the UI, are the same portfolio
+    assert ppp.calculate_portfolio_performance('2010-01-01', '2011-01-01', tickers,
+                                               Weighting.EQUAL, Rebalancing.MONTHLY) is perf
+    mock_sdr.get_stock_price_data.assert_not_called()
+    assert ppp.calculate_portfolio_performance(pd.Timestamp(2010, 1, 1), pd.Timestamp(2011, 1, 1), tickers,
+                                               Weighting.EQUAL, Rebalancing.WEEKLY) is not perf
+
+def test_calculate_portfolio_performance_concurrent(ppp: PortfolioPerformanceProvider, mock_sdr,
+                                                    tickers: List[str]):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        perfs = list(executor.map(lambda _: ppp.calculate_portfolio_performance(
+            pd.Timestamp(2010, 1, 1), pd.Timestamp(2011, 1, 1), tickers, Weighting.EQUAL), range(4)))
+
+    assert all(p is perfs[0] for p in perfs)
+    # Each ticker loaded once, for the one calculation
+    assert mock_sdr.get_stock_price_data.call_count == len(tickers)
+
+def test_calculate_portfolio_performance_data_version(ppp: PortfolioPerformanceProvider, mock_sdr,
+                                                      tickers: List[str]):
+    perf = ppp.calculate_portfolio_performance(pd.Timestamp(2010, 1, 1), pd.Timestamp(2011, 1, 1), tickers,
+                                               Weighting.EQUAL)
+    mock_sdr.get_data_version.return_value = ('v2', mock_sdr.get_data_version.return_value[1])
+
+    assert ppp.calculate_portfolio_performance(pd.Timestamp(2010, 1, 1), pd.Timestamp(2011, 1, 1), tickers,
+                                               Weighting.EQUAL) is not perf
+
+def test_calculate_portfolio_performance_errors_not_cached(ppp: PortfolioPerformanceProvider, mock_sdr,
+                                                           tickers: List[str]):
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            ppp.calculate_portfolio_performance(pd.Timestamp(2031, 1, 1), pd.Timestamp(2031, 1, 5), tickers,
+                                                Weighting.EQUAL)
+
+    assert mock_sdr.get_stock_price_data.call_count == 2 * len(tickers)
+
 
 if __name__ == "__main__":
     import pytest
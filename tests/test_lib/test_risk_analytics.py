@@ -0,0 +1,84 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from typing import List
+
+from lib.portfolio_performance import PortfolioPerformanceProvider, Weighting
+from lib.risk_analytics import RiskAnalyticsProvider
+
+
+@pytest.fixture
+def returns():
+    rng = np.random.default_rng(0)
+    idx = pd.bdate_range(pd.Timestamp(2010, 1, 1), periods=700)
+    stock_ret = pd.DataFrame(rng.normal(0.0005, 0.02, (len(idx), 3)), index=idx, columns=['A', 'B', 'C'])
+    stock_ret.iloc[:300, 2] = np.nan
+    port_ret = stock_ret.mean(axis=1)
+
+    return port_ret, stock_ret
+
+def test_rolling_vol(returns):
+    port_ret, stock_ret = returns
+    ra = RiskAnalyticsProvider(rp=object()).calculate_rolling_statistics(port_ret.index, port_ret.to_numpy(), stock_ret)
+    expected = port_ret.rolling(252).std() * np.sqrt(252)
+
+    assert np.allclose(ra.rolling_vol['1y'], expected, equal_nan=True)
+    assert ra.rolling_vol['3y'].isna().all()
+
+def test_rolling_beta_no_returns(returns):
+    port_ret, stock_ret = returns
+    stock_ret['C'] = np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        ra = RiskAnalyticsProvider(rp=object()).calculate_rolling_statistics(port_ret.index, port_ret.to_numpy(),
+                                                                             stock_ret)
+
+    assert ra.rolling_beta['C'].isna().all()
+    assert ra.rolling_beta['A'].iloc[-1] > 0
+
+def test_rolling_sharpe(returns):
+    port_ret, stock_ret = returns
+    ra = RiskAnalyticsProvider(rp=object()).calculate_rolling_statistics(port_ret.index, port_ret.to_numpy(), stock_ret)
+    ann_ret = (port_ret + 1).rolling(252).apply(np.prod) ** (252 / 252) - 1
+
+    assert np.allclose(ra.rolling_sharpe['1y'], ann_ret / ra.rolling_vol['1y'], equal_nan=True)
+
+def test_rolling_beta(returns):
+    port_ret, stock_ret = returns
+    ra = RiskAnalyticsProvider(rp=object()).calculate_rolling_statistics(port_ret.index, port_ret.to_numpy(), stock_ret)
+
+    for t in stock_ret.columns:
+        mask = stock_ret[t].notna()
+        pr = port_ret.where(mask)
+        expected = stock_ret[t].rolling(252, min_periods=126).cov(pr) / pr.rolling(252, min_periods=126).var()
+        assert np.allclose(ra.rolling_beta[t], expected, equal_nan=True)
+
+def test_drawdown():
+    idx = pd.bdate_range(pd.Timestamp(2010, 1, 1), periods=6)
+    port_ret = np.array([0, 0.1, -0.5, 0.2, 1, -0.1])
+    ra = RiskAnalyticsProvider(rp=object()).calculate_rolling_statistics(idx, port_ret, pd.DataFrame(index=idx))
+
+    assert ra.max_drawdown == pytest.approx(-0.5)
+    assert ra.max_drawdown_duration == 2
+    assert ra.drawdown.iloc[-1] == pytest.approx(-0.1)
+
+def test_calculate_risk_analytics_cached(ppp: PortfolioPerformanceProvider, rp, mock_sdr, tickers: List[str]):
+    perf = ppp.calculate_portfolio_performance(pd.Timestamp(2010, 1, 1), pd.Timestamp(2012, 1, 1),
+                                               tickers, Weighting.EQUAL)
+    rap = RiskAnalyticsProvider(rp=rp)
+    ra = rap.calculate_risk_analytics(perf)
+    mock_sdr.get_stock_price_data.reset_mock()
+
+    assert rap.calculate_risk_analytics(perf) is ra
+    mock_sdr.get_stock_price_data.assert_not_called()
+    assert ra.rolling_beta.columns.isin(tickers).all()
+    assert ra.max_drawdown == 0
+
+
+if __name__ == "__main__":
+    import pytest
+
+    pytest.main()
@@ -0,0 +1,77 @@
+import os
+
+import pandas as pd
+import pytest
+
+from lib.stock_data_repository import StockDataRepository
+
+
+def test_query_stock_standing_data_tickers(sdr: StockDataRepository):
+    sd, rows = sdr.query_stock_standing_data(['MSFT', 'AAPL', 'BA'])
+
+    assert sd['Symbol'].tolist() == ['AAPL', 'BA', 'MSFT']
+    assert rows == 3
+    assert 'Date added' not in sd.columns
+
+def test_query_stock_standing_data_pages(sdr: StockDataRepository):
+    tickers = ['MSFT', 'AAPL', 'GOOG', 'BA', 'XOM']
+    sd, rows = sdr.query_stock_standing_data(tickers, page=1, page_size=2)
+
+    assert sd['Symbol'].tolist() == ['GOOG', 'MSFT']
+    assert rows == 5
+
+def test_query_stock_standing_data_filters(sdr: StockDataRepository):
+    tickers = ['MSFT', 'AAPL', 'GOOG', 'BA', 'XOM']
+    sd, rows = sdr.query_stock_standing_data(tickers, [('GICS Sector', 'contains', 'tech'), ('CIK', 'gt', 500000)])
+
+    assert sd['Symbol'].tolist() == ['MSFT']
+    assert rows == 1
+
+def test_query_stock_standing_data_filters_numbers_in_text(sdr: StockDataRepository):
+    tickers = ['MSFT', 'AAPL', 'GOOG', 'BA', 'XOM']
+    sd, _ = sdr.query_stock_standing_data(tickers, [('Founded', 'ge', 1977)])
+
+    assert sd['Symbol'].tolist() == ['AAPL', 'GOOG']
+
+def test_query_stock_standing_data_contains_number(sdr: StockDataRepository):
+    tickers = ['MSFT', 'AAPL', 'GOOG', 'BA', 'XOM']
+    sd, _ = sdr.query_stock_standing_data(tickers, [('CIK', 'contains', '7890'), ('Founded', 'contains', '1975')])
+
+    assert sd['Symbol'].tolist() == ['MSFT']
+
+def test_query_stock_standing_data_sort(sdr: StockDataRepository):
+    tickers = ['MSFT', 'AAPL', 'GOOG', 'BA', 'XOM']
+    sd, _ = sdr.query_stock_standing_data(tickers, sort_by=[('GICS Sector', True), ('CIK', False)])
+
+    assert sd['Symbol'].tolist() == ['GOOG', 'XOM', 'BA', 'MSFT', 'AAPL']
+
+@pytest.mark.parametrize('filters, sort_by', [([('Nothing', 'eq', 1)], None), (None, [('Date added', True)])])
+def test_query_stock_standing_data_unknown_column(sdr: StockDataRepository, filters, sort_by):
+    with pytest.raises(ValueError):
+        sdr.query_stock_standing_data(['MSFT'], filters, sort_by)
+
+def test_get_data_version_drops_stale_data(sdr: StockDataRepository, tmp_path):
+    prices = tmp_path / 'MSFT.csv'
+    pd.DataFrame({'Date': ['2020-01-02'], 'Adj Close': [1.0]}).to_csv(prices, index=False)
+    version, _ = sdr.get_data_version()
+    assert sdr.get_stock_price_data('MSFT')['Adj Close'].tolist() == [1.0]
+
+    pd.DataFrame({'Date': ['2020-01-02'], 'Adj Close': [2.0]}).to_csv(prices, index=False)
+    # Making sure the modification time moves on, whatever the file system's resolution
+    os.utime(prices, ns=(os.stat(prices).st_atime_ns, os.stat(prices).st_mtime_ns + 10**9))
+
+    assert sdr.get_data_version()[0] != version
+    assert sdr.data_generation == 1
+    assert sdr.get_stock_price_data('MSFT')['Adj Close'].tolist() == [2.0]
+
+def test_get_data_version_unchanged(sdr: StockDataRepository):
+    sdr.query_stock_standing_data(['MSFT'])
+
+    assert sdr.get_data_version() == sdr.get_data_version()
+    assert sdr.data_generation == 0
+
+
+if __name__ == "__main__":
+    import pytest
+
+    pytest.main()
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from lib.return_provider import ReturnProvider
+from lib.stock_data_repository import StockDataRepository
+from tools.load_test import LoadTestResult, create_synthetic_data, run_load_test
+
+
+def test_create_synthetic_data_tickers(tmp_path):
+    tickers = create_synthetic_data(str(tmp_path), 5)
+    sdr = StockDataRepository(data_dir=str(tmp_path))
+
+    assert sorted(sdr.get_stocks_with_prices()) == tickers
+    assert sdr.get_stock_standing_data(tickers)['Symbol'].tolist() == tickers
+
+def test_create_synthetic_data_returns(tmp_path):
+    tickers = create_synthetic_data(str(tmp_path), 5)
+    rp = ReturnProvider(StockDataRepository(data_dir=str(tmp_path)))
+    ret = rp.get_stock_return_data(pd.Timestamp(2000, 1, 1), pd.Timestamp(2024, 1, 26), tickers)
+
+    assert ret.columns.tolist() == tickers
+    assert ret.abs().max().max() > 0
+
+def test_load_test_result_percentile():
+    result = LoadTestResult(latencies_ms=np.arange(1, 101), errors=0, duration_s=10, workers=[], callbacks_per_click=4)
+
+    assert result.percentile(50) == 50.5
+    assert result.throughput == 10
+
+def test_run_load_test(tmp_path):
+    create_synthetic_data(str(tmp_path), 3)
+    result = run_load_test(str(tmp_path), workers=1, requests=2, warmup=0)
+
+    assert result.errors == 0
+    assert len(result.latencies_ms) == 2
+    # Stock returns, portfolio performance, risk analytics and correlations
+    assert result.callbacks_per_click == 4
+
+
+if __name__ == "__main__":
+    import pytest
+
+    pytest.main()
@@ -0,0 +1,307 @@
+"""
+Local load testing of the Dash server.
+
+Starts worker processes serving the app from AppCreator against a synthetic data directory, and replays
+clicks of the Refresh button with mixed date ranges, weightings and rebalancing at a given concurrency.
+Like the browser, each click sends every callback the button fires in parallel, and the click takes as
+long as the slowest of them.
+
+Usage: python -m tools.load_test --tickers 100 --workers 2 --concurrency 8 --requests 200
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing as mp
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from logging import getLogger
+
+from lib.portfolio_performance import Rebalancing, Weighting
+
+
+log = getLogger(__name__)
+
+SECTORS = ['Communication Services', 'Consumer Discretionary', 'Consumer Staples', 'Energy', 'Financials',
+           'Health Care', 'Industrials', 'Information Technology', 'Materials', 'Real Estate', 'Utilities']
+
+# Requests stay within the dates allowed on the sidebar, prices start earlier to have history for vols
+PRICES_START = pd.Timestamp(1995, 1, 2)
+DATA_START = pd.Timestamp(2000, 1, 3)
+DATA_END = pd.Timestamp(2024, 1, 26)
+
+
+@dataclass
+class WorkerStats:
+    """Data struct to hold the memory usage of a server worker."""
+
+    pid: int
+    rss_mb: Optional[float]
+    peak_rss_mb: Optional[float]
+
+
+@dataclass
+class LoadTestResult:
+    """Data struct to hold load test results."""
+
+    latencies_ms: np.ndarray
+    errors: int
+    duration_s: float
+    workers: List[WorkerStats]
+    callbacks_per_click: int
+
+    @property
+    def throughput(self):
+        return len(self.latencies_ms) / self.duration_s
+
+    def percentile(self, q: float) -> float:
+        return float(np.percentile(self.latencies_ms, q)) if len(self.latencies_ms) else float('nan')
+
+
+def create_synthetic_data(data_dir: str, n_tickers: int, seed: int = 0,
+                          standing_data_file: str = 'standing_data.csv') -> List[str]:
+    """Populate a data directory with random walk prices and standing data, in the format of the real data.
+
+    Args:
+        data_dir (str): The directory to write the CSVs to
+        n_tickers (int): Number of stocks to generate
+        seed (int, optional): Random seed, for repeatable data. Defaults to 0.
+        standing_data_file (str, optional): The file with stock standing data. Defaults to 'standing_data.csv'.
+
+    Returns:
+        List[str]: The tickers generated
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(PRICES_START, DATA_END)
+    tickers = [f'S{i:04d}' for i in range(n_tickers)]
+
+    for t in tickers:
+        # A quarter of the stocks list later, to have some missing history like the real data
+        start = rng.integers(len(dates) // 2) if rng.random() < 0.25 else 0
+        n = len(dates) - start
+        close = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, n)))
+        pd.DataFrame({'Date': dates[start:],
+                      'Open': close, 'High': close, 'Low': close, 'Close': close, 'Adj Close': close,
+                      'Volume': rng.integers(1e5, 1e7, n)}
+                     ).to_csv(os.path.join(data_dir, f'{t}.csv'), index=False, float_format='%.6f')
+
+    pd.DataFrame({'Symbol': tickers,
+                  'Security': [f'Synthetic {t}' for t in tickers],
+                  'GICS Sector': rng.choice(SECTORS, n_tickers),
+                  'GICS Sub-Industry': 'Synthetic',
+                  'Headquarters Location': 'Nowhere',
+                  'Date added': '01/01/2000',
+                  'CIK': range(n_tickers),
+                  'Founded': 2000}
+                 ).to_csv(os.path.join(data_dir, standing_data_file), index=False)
+
+    return tickers
+
+
+def _serve(data_dir: str, threaded: bool, port_queue: mp.Queue):
+    """Worker process entry point, serving the app on a free port and reporting the port back."""
+    import logging
+    from werkzeug.serving import make_server
+    from app_creator import AppCreator
+
+    # Request logging of every callback would flood the report
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    server = make_server('127.0.0.1', 0, AppCreator(data_dir).create_app(), threaded=threaded)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def _memory_mb(pid: int) -> Tuple[Optional[float], Optional[float]]:
+    """Current and peak resident memory of a process, from /proc so only available on Linux."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            status = dict(line.split(':', 1) for line in f)
+    except OSError:
+        return None, None
+
+    return int(status['VmRSS'].split()[0]) / 1024, int(status['VmHWM'].split()[0]) / 1024
+
+
+def _post(url: str, payload: Dict, timeout: float) -> bytes:
+    req = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return resp.read()
+
+
+def _post_all(url: str, payloads: List[Dict], timeout: float):
+    """Post the payloads in parallel, like the browser does for the callbacks of one click."""
+    with ThreadPoolExecutor(max_workers=len(payloads)) as executor:
+        for f in [executor.submit(_post, url, p, timeout) for p in payloads]:
+            f.result()
+
+
+class CallbackPayloadFactory:
+    """Builds the _dash-update-component payloads of all the callbacks fired by a Refresh click.
+
+    Component ids are generated by Dash, so they are looked up from the server's callback dependencies.
+    """
+    def __init__(self, base_url: str, seed: int = 0):
+        with urllib.request.urlopen(f'{base_url}/_dash-dependencies') as resp:
+            deps = json.loads(resp.read())
+
+        # The portfolio refresh has the dates, the weighting and the rebalancing as state, in that order,
+        # and its input is the Refresh button
+        portfolio = [d for d in deps if [s['property'] for s in d['state']] == ['date', 'date', 'value', 'value']]
+        if not portfolio:
+            raise ValueError('No callback has the dates, weighting and rebalancing of the sidebar as state, '
+                             'the load test needs updating to the callbacks of the app')
+        self.__input = portfolio[0]['inputs'][0]
+        self.__sidebar = [f'{s["id"]}.{s["property"]}' for s in portfolio[0]['state']]
+        self.__callbacks = [d for d in deps if d['inputs'] == [self.__input]]
+        self.__total_days = len(pd.bdate_range(DATA_START, DATA_END))
+        self.__rnd = random.Random(seed)
+        self.__clicks = 0
+
+    @staticmethod
+    def __outputs(output: str):
+        """Id and property of the outputs, a list for multi output callbacks, whose output is '..a.x...b.y..'."""
+        outputs = [dict(zip(('id', 'property'), o.rsplit('.', 1))) for o in output.strip('.').split('...')]
+        return outputs if output.startswith('..') else outputs[0]
+
+    @property
+    def callbacks(self) -> int:
+        """Number of callbacks fired by each click."""
+        return len(self.__callbacks)
+
+    def __call__(self) -> List[Dict]:
+        """The payloads of a click, with a random date range of 1 to 20 years, and random weighting and rebalancing."""
+        days = self.__rnd.randint(252, 20 * 252)
+        start = DATA_START + pd.offsets.BDay(self.__rnd.randint(0, self.__total_days - days))
+        end = start + pd.offsets.BDay(days)
+        weighting = self.__rnd.choice(list(Weighting.__members__))
+        rebalancing = self.__rnd.choice(list(Rebalancing.__members__))
+
+        self.__clicks += 1
+        values = dict(zip(self.__sidebar, [start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'),
+                                           weighting, rebalancing]))
+        return [{'output': dep['output'],
+                 'outputs': self.__outputs(dep['output']),
+                 'inputs': [dict(self.__input, value=self.__clicks)],
+                 'changedPropIds': [f'{self.__input["id"]}.{self.__input["property"]}'],
+                 'state': [dict(st, value=values[f'{st["id"]}.{st["property"]}']) for st in dep['state']]}
+                for dep in self.__callbacks]
+
+
+def run_load_test(data_dir: str, workers: int = 1, concurrency: int = 4, requests: int = 100,
+                  threaded: bool = True, warmup: int = 2, timeout: float = 120, seed: int = 0) -> LoadTestResult:
+    """Start the server workers and replay Refresh clicks against them.
+
+    Args:
+        data_dir (str): Directory with the data CSVs
+        workers (int, optional): Number of server processes, clicks go round robin. Defaults to 1.
+        concurrency (int, optional): Number of clicks in flight at any time. Defaults to 4.
+        requests (int, optional): Number of timed clicks, each sending all the callbacks of a Refresh.
+            Defaults to 100.
+        threaded (bool, optional): Whether each worker serves requests concurrently. Defaults to True.
+        warmup (int, optional): Untimed clicks per worker, to populate the caches. Defaults to 2.
+        timeout (float, optional): Request timeout in seconds. Defaults to 120.
+        seed (int, optional): Random seed for the request mix. Defaults to 0.
+
+    Returns:
+        LoadTestResult: The click latencies, errors, duration and memory usage of the workers
+    """
+    ctx = mp.get_context('spawn')
+    port_queue = ctx.Queue()
+    procs = [ctx.Process(target=_serve, args=(data_dir, threaded, port_queue), daemon=True)
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+
+    try:
+        urls = [f'http://127.0.0.1:{port_queue.get(timeout=timeout)}' for _ in procs]
+        payload = CallbackPayloadFactory(urls[0], seed)
+
+        for url in urls:
+            for _ in range(warmup):
+                _post_all(f'{url}/_dash-update-component', payload(), timeout)
+
+        def timed_click(i: int) -> Optional[float]:
+            # Payloads are built upfront, so that the client does not add to the latency
+            url, bodies = jobs[i]
+            start = time.perf_counter()
+            try:
+                _post_all(url, bodies, timeout)
+            except Exception as e:
+                log.warning('Click %d failed: %s', i, e)
+                return None
+            return 1000 * (time.perf_counter() - start)
+
+        jobs = [(f'{urls[i % len(urls)]}/_dash-update-component', payload()) for i in range(requests)]
+        log.info('Sending %d clicks of %d callbacks each to %d workers with concurrency %d',
+                 requests, payload.callbacks, workers, concurrency)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(timed_click, range(requests)))
+        duration = time.perf_counter() - start
+
+        stats = [WorkerStats(p.pid, *_memory_mb(p.pid)) for p in procs]
+    finally:
+        for p in procs:
+            p.terminate()
+            p.join()
+
+    ok = np.array([lat for lat in latencies if lat is not None])
+    return LoadTestResult(latencies_ms=ok, errors=len(latencies) - len(ok), duration_s=duration, workers=stats,
+                          callbacks_per_click=payload.callbacks)
+
+
+def print_report(result: LoadTestResult):
+    print(f'Refresh clicks: {len(result.latencies_ms)} ok, {result.errors} errors in {result.duration_s:.1f}s, '
+          f'{result.callbacks_per_click} callbacks each')
+    print(f'Throughput: {result.throughput:.2f} clicks/s')
+    print('Latency: ' + ', '.join(f'p{q} {result.percentile(q):.0f}ms' for q in (50, 95, 99)))
+    for w in result.workers:
+        if w.rss_mb is None:
+            print(f'Worker {w.pid}: RSS n/a')
+        else:
+            print(f'Worker {w.pid}: RSS {w.rss_mb:.0f}MB, peak {w.peak_rss_mb:.0f}MB')
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Load test the Dash server against synthetic data.')
+    parser.add_argument('--tickers', type=int, default=50, help='Number of synthetic stocks')
+    parser.add_argument('--data-dir', help='Use (or populate, if empty) this directory instead of a temporary one')
+    parser.add_argument('--workers', type=int, default=1, help='Number of server processes')
+    parser.add_argument('--concurrency', type=int, default=4, help='Number of Refresh clicks in flight')
+    parser.add_argument('--requests', type=int, default=100, help='Number of timed Refresh clicks')
+    parser.add_argument('--single-threaded', action='store_true', help='Serve one request at a time per worker')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for data and request mix')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        os.makedirs(data_dir, exist_ok=True)
+        if not os.listdir(data_dir):
+            log.info('Generating %d synthetic stocks in %s', args.tickers, data_dir)
+            create_synthetic_data(data_dir, args.tickers, args.seed)
+
+        result = run_load_test(data_dir, workers=args.workers, concurrency=args.concurrency,
+                               requests=args.requests, threaded=not args.single_threaded, seed=args.seed)
+
+    print_report(result)
+
+
+if __name__ == "__main__":
+    import logging
+    logging.basicConfig(format='%(asctime)s: %(name)s|%(levelname)s|%(message)s',
+                        datefmt='%Y-%m-%d %H:%M:%S')
+    logging.getLogger(__name__).setLevel(logging.INFO)
+
+    main(sys.argv[1:])